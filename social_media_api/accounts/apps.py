@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from .authentication import connect_signals
+        from .search_index import restore_search_index
+        connect_signals()
+        post_migrate.connect(restore_search_index, sender=self,
+                             dispatch_uid='accounts_restore_search_index')
@@ -0,0 +1,252 @@
+"""
+Cached token authentication.
+
+CachedTokenAuthentication resolves "Authorization: Token <key>" without
+touching the database in the common case. Lookups go through two layers:
+
+    local   a bounded LRU per process, entries expire after TOKEN_AUTH_CACHE['TTL']
+    shared  an optional Django cache (e.g. Redis) named by TOKEN_AUTH_CACHE['SHARED_CACHE']
+
+and fall back to the usual Token JOIN user query. Each hit rebuilds a
+fresh user instance from the cached column values, so requests never
+share a mutable user object. The password hash is never cached.
+
+Entries are dropped when a token is deleted or its user is saved
+(password change, deactivation, profile edit), and when follow counters
+change. Other processes learn about it through a per-user version in the
+shared cache: every local entry remembers the version it was loaded
+under and is only used while that is still current. The shared cache
+must be shared between workers (see social_media_api.caching); without
+one, local entries in other processes live until TTL, so keep it to a
+few seconds. Invalidation is repeated once the surrounding transaction
+commits, so a request that read the old row in between cannot leave it
+cached. Changes made with queryset.update() bypass signals and must call
+invalidate_user() themselves.
+
+Options are read from settings on use, so the LRU picks up changes to
+TOKEN_AUTH_CACHE without a restart. Hit rates are reported per process
+to staff at /api/auth/token-cache/.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from social_media_api.caching import bump_version, get_version, shared_cache
+
+TOKEN_KEY = 'auth:token:{}'
+USER_KEY = 'auth:user:{}'
+VERSION_KEY = 'auth:version:{}'
+
+DEFAULTS = {
+    'MAX_ENTRIES': 10000,
+    'TTL': 5,
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+}
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+class TokenCache:
+    """Thread-safe LRU of token key -> (user id, user column values, version) with a TTL"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+        self.hits = self.shared_hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user_id, values, version, expires = entry
+            if expires < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return user_id, values, version
+
+    def set(self, key, user_id, values, version=None):
+        options = get_options()
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (user_id, values, version, time.monotonic() + options['TTL'])
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > options['MAX_ENTRIES']:
+                self._discard(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+            }
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[0]]
+
+
+token_cache = TokenCache()
+
+
+def _shared_cache():
+    return shared_cache(get_options()['SHARED_CACHE'])
+
+
+def _version(shared, user_id):
+    return get_version(shared, VERSION_KEY.format(user_id)) if shared is not None else None
+
+
+def _user_fields():
+    # The password hash stays out of caches; it is loaded on access
+    return [field.attname for field in get_user_model()._meta.concrete_fields
+            if field.attname != 'password']
+
+
+def _dump(user):
+    return tuple(getattr(user, name) for name in _user_fields())
+
+
+def _load(values):
+    return get_user_model().from_db('default', _user_fields(), values)
+
+
+def remember(key, user, version=None):
+    """Prime both layers, e.g. right after login issues a token"""
+    values = _dump(user)
+    shared = _shared_cache()
+    if shared is not None:
+        if version is None:
+            version = _version(shared, user.pk)
+        ttl = get_options()['SHARED_TTL']
+        shared.set_many({TOKEN_KEY.format(key): user.pk, USER_KEY.format(user.pk): values}, ttl)
+    token_cache.set(key, user.pk, values, version)
+
+
+def _on_commit_too(invalidate):
+    """Invalidate now, and again once the surrounding transaction commits"""
+    @functools.wraps(invalidate)
+    def wrapper(*args):
+        invalidate(*args)
+        transaction.on_commit(lambda: invalidate(*args))
+    return wrapper
+
+
+@_on_commit_too
+def invalidate_token(key, user_id=None):
+    token_cache.delete(key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(TOKEN_KEY.format(key))
+        if user_id is not None:
+            bump_version(shared, VERSION_KEY.format(user_id))
+
+
+@_on_commit_too
+def invalidate_user(user_id):
+    token_cache.delete_user(user_id)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(USER_KEY.format(user_id))
+        bump_version(shared, VERSION_KEY.format(user_id))
+
+
+def cache_stats():
+    return token_cache.stats()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that answers repeat requests from the token cache"""
+
+    def authenticate_credentials(self, key):
+        shared = _shared_cache()
+        cached = token_cache.get(key)
+        if cached is not None:
+            user_id, values, version = cached
+            if shared is None or version == _version(shared, user_id):
+                token_cache.record('hits')
+                return self._resolve(key, user_id, values)
+            # Invalidated by another process
+            token_cache.delete(key)
+
+        user_id = version = None
+        if shared is not None:
+            user_id = shared.get(TOKEN_KEY.format(key))
+            if user_id is not None:
+                # Read before the values, so a concurrent invalidation wins
+                version = _version(shared, user_id)
+                values = shared.get(USER_KEY.format(user_id))
+                if values is not None:
+                    token_cache.record('shared_hits')
+                    token_cache.set(key, user_id, values, version)
+                    return self._resolve(key, user_id, values)
+
+        token_cache.record('misses')
+        user, token = super().authenticate_credentials(key)
+        remember(key, user, version if token.user_id == user_id else None)
+        return user, token
+
+    def _resolve(self, key, user_id, values):
+        user = _load(values)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        token = Token(key=key, user_id=user_id)
+        token.user = user
+        return user, token
+
+
+def _token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key, instance.user_id)
+
+
+def _user_saved(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+def connect_signals():
+    post_delete.connect(_token_deleted, sender=Token, dispatch_uid='token_cache_token_deleted')
+    post_save.connect(_user_saved, sender=get_user_model(), dispatch_uid='token_cache_user_saved')
+    post_delete.connect(_user_saved, sender=get_user_model(), dispatch_uid='token_cache_user_deleted')
@@ -0,0 +1,62 @@
+"""
+Follow-graph cache.
+
+A user's following set is loaded once, cached under a versioned key in
+the FOLLOW_GRAPH_CACHE cache and memoized on the user instance for the
+rest of the request. Membership checks such as "does the viewer follow
+this author" are then set lookups instead of a query per rendered user.
+
+follow()/unfollow() bump the version, so every process sees the new set
+on its next read. With a process-local cache other workers only see it
+once their copy expires, after LOCAL_CACHE_TTL seconds (see
+social_media_api.caching).
+"""
+from django.conf import settings
+
+from social_media_api.caching import bump_version, get_version, versioned_cache
+
+VERSION_KEY = 'follow-graph:version:{}'
+SET_KEY = 'follow-graph:{}:{}'
+TIMEOUT = 60 * 60
+
+
+def _cache():
+    return versioned_cache(getattr(settings, 'FOLLOW_GRAPH_CACHE', 'default'))
+
+
+def _load(user):
+    Follow = type(user).followers.through
+    # A row (from_customuser=A, to_customuser=B) means B follows A.
+    return frozenset(Follow.objects.filter(to_customuser=user.pk)
+                     .values_list('from_customuser', flat=True))
+
+
+def following_ids(user):
+    """Ids of the users `user` follows, as a frozenset"""
+    memo = getattr(user, '_following_ids', None)
+    if memo is not None:
+        return memo
+
+    cache = _cache()
+    if cache is None:
+        ids = _load(user)
+    else:
+        key = SET_KEY.format(user.pk, get_version(cache, VERSION_KEY.format(user.pk)))
+        ids = cache.get(key)
+        if ids is None:
+            ids = _load(user)
+            cache.set(key, ids, TIMEOUT)
+    user._following_ids = ids
+    return ids
+
+
+def is_following(user, other):
+    return other.pk in following_ids(user)
+
+
+def invalidate(user):
+    """Drop the cached following set after the user follows or unfollows someone"""
+    user.__dict__.pop('_following_ids', None)
+    cache = _cache()
+    if cache is not None:
+        bump_version(cache, VERSION_KEY.format(user.pk))
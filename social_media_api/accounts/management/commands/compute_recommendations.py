@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from accounts.recommendations import SCIPY_AVAILABLE, compute_recommendations, top_k
+
+
+class Command(BaseCommand):
+    help = 'Recomputes "people you may know" recommendations from the follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None,
+                            help='Candidates kept per user (default: RECOMMENDATIONS_TOP_K)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Users scored and written per batch (default: 1000)')
+        parser.add_argument('--pure-python', action='store_true',
+                            help='Skip the NumPy/SciPy implementation even if installed')
+
+    def handle(self, *args, **options):
+        use_scipy = SCIPY_AVAILABLE and not options['pure_python']
+        scored, rewritten = compute_recommendations(
+            k=options['top_k'] or top_k(),
+            batch_size=options['batch_size'],
+            use_scipy=use_scipy,
+        )
+        engine = 'scipy' if use_scipy else 'python'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {scored} user(s) with {engine}; rewrote {rewritten} recommendation list(s)'
+        ))
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+POSTGRES_ACTIVITY = """
+    SELECT COALESCE(state, 'unknown'), COUNT(*)
+    FROM pg_stat_activity
+    WHERE datname = current_database()
+    GROUP BY 1
+"""
+
+
+class Command(BaseCommand):
+    help = 'Reports database connection usage against the gunicorn worker model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Alias to inspect; repeat for several (default: all)')
+
+    def handle(self, *args, **options):
+        pool = getattr(settings, 'DATABASE_POOL', {'WORKERS': 1, 'THREADS': 1})
+        expected = pool['WORKERS'] * pool['THREADS']
+        self.stdout.write(
+            f"Gunicorn: {pool['WORKERS']} worker(s) x {pool['THREADS']} thread(s) "
+            f"= up to {expected} connection(s) per database"
+        )
+        for alias in options['databases'] or list(settings.DATABASES):
+            self.report(alias, expected)
+
+    def report(self, alias, expected):
+        connection = connections[alias]
+        max_age = connection.settings_dict.get('CONN_MAX_AGE') or 0
+        persistent = 'persistent' if max_age is None or max_age > 0 else 'per request'
+        self.stdout.write(f"\n[{alias}] {connection.vendor}, connections {persistent} "
+                          f"(CONN_MAX_AGE={max_age})")
+        try:
+            if connection.vendor == 'postgresql':
+                self.report_postgres(connection, expected)
+            elif connection.vendor == 'sqlite':
+                self.report_sqlite(connection)
+            else:
+                self.stdout.write('  No utilization query for this backend')
+        except Exception as exc:
+            self.stdout.write(self.style.ERROR(f'  Unavailable: {exc}'))
+
+    def report_postgres(self, connection, expected):
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW max_connections')
+            max_connections = int(cursor.fetchone()[0])
+            cursor.execute(POSTGRES_ACTIVITY)
+            states = dict(cursor.fetchall())
+        in_use = sum(states.values())
+        breakdown = ', '.join(f'{state} {count}' for state, count in sorted(states.items()))
+        self.stdout.write(f'  In use: {in_use} of {max_connections} ({breakdown})')
+        self.stdout.write(f'  Utilization: {in_use / max_connections:.0%}')
+        if expected > max_connections:
+            self.stdout.write(self.style.WARNING(
+                f'  Workers may open {expected} connections but the server allows '
+                f'{max_connections}; lower WEB_CONCURRENCY/GUNICORN_THREADS or add a pooler'
+            ))
+
+    def report_sqlite(self, connection):
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.stdout.write('  ' + ', '.join(f'{name}={value}' for name, value in pragmas.items()))
+        if str(pragmas['journal_mode']).lower() != 'wal':
+            self.stdout.write(self.style.WARNING(
+                '  Not in WAL mode; concurrent workers will hit "database is locked"'
+            ))
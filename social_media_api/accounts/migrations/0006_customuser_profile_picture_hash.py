@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+# SQLite rebuilds accounts_customuser to add the column, which drops the
+# search index triggers; accounts.search_index restores them after migrate.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_picture_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
@@ -1,9 +1,20 @@
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Exists, OuterRef
+from social_media_api.querysets import CounterQuerySet
+from . import graph
+
+class CustomUserQuerySet(CounterQuerySet):
+    pass
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
 
 class CustomUser(AbstractUser):
     bio = models.TextField(max_length=500, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # Content hash naming the rendered thumbnails, see accounts.thumbnails
+    profile_picture_hash = models.CharField(max_length=32, blank=True, editable=False)
     followers = models.ManyToManyField(
         'self',
         symmetrical=False,
@@ -12,32 +23,203 @@ class CustomUser(AbstractUser):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
 
-    def __str__(self):
-        return self.username
+    objects = CustomUserManager()
 
-    @property
-    def followers_count(self):
-        return self.followers.count()
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Keyset pagination of the user directory
+            models.Index(fields=['-created_at', '-id'], name='user_recent_idx'),
+        ]
 
-    @property
-    def following_count(self):
-        return self.following.count()
+    def __str__(self):
+        return self.username
 
     def follow(self, user):
         """Follow another user"""
-        if user != self and not self.following.filter(id=user.id).exists():
-            self.following.add(user)
-            return True
-        return False
+        if user == self:
+            return False
+        from posts.feed import backfill_feed
+        with transaction.atomic():
+            if not self._insert_follows([user.pk]):
+                return False
+            self._adjust_follow_counts(user, 1)
+        graph.invalidate(self)
+        backfill_feed(self, user)
+        return True
 
     def unfollow(self, user):
         """Unfollow a user"""
-        if self.following.filter(id=user.id).exists():
-            self.following.remove(user)
-            return True
-        return False
+        from posts.feed import remove_author
+        with transaction.atomic():
+            if not self._delete_follows([user.pk]):
+                return False
+            self._adjust_follow_counts(user, -1)
+        graph.invalidate(self)
+        remove_author(self, user)
+        return True
+
+    def follow_many(self, user_ids):
+        """
+        Follow several users at once. Returns (followed, already_following,
+        skipped) id lists; unknown ids and the user's own id are skipped.
+        """
+        already, new, skipped = self._follow_state(user_ids)
+        if new:
+            from posts.feed import backfill_authors
+            with transaction.atomic():
+                followed = self._insert_follows(new)
+                if followed:
+                    self._adjust_bulk_follow_counts(followed, 1)
+            # Followed concurrently by another request in the meantime
+            already = sorted([*already, *set(new) - set(followed)])
+            new = followed
+            graph.invalidate(self)
+            backfill_authors(self, new)
+        return new, already, skipped
+
+    def unfollow_many(self, user_ids):
+        """
+        Unfollow several users at once. Returns (unfollowed, not_following,
+        skipped) id lists.
+        """
+        following, not_following, skipped = self._follow_state(user_ids)
+        if following:
+            from posts.feed import remove_authors
+            with transaction.atomic():
+                unfollowed = self._delete_follows(following)
+                if unfollowed:
+                    self._adjust_bulk_follow_counts(unfollowed, -1)
+            not_following = sorted([*not_following, *set(following) - set(unfollowed)])
+            following = unfollowed
+            graph.invalidate(self)
+            remove_authors(self, following)
+        return following, not_following, skipped
+
+    def _insert_follows(self, user_ids):
+        """
+        Follow `user_ids`, returning the sorted ids whose rows this call
+        inserted. Counters are adjusted by exactly those, so concurrent
+        follows of the same user cannot count twice.
+        """
+        Follow = CustomUser.followers.through
+        using = router.db_for_write(Follow)
+        connection = connections[using]
+        if not connection.features.can_return_columns_from_insert:
+            inserted = []
+            for pk in user_ids:
+                try:
+                    with transaction.atomic(using=using):
+                        Follow.objects.using(using).create(from_customuser_id=pk, to_customuser_id=self.pk)
+                except IntegrityError:
+                    continue
+                inserted.append(pk)
+            return sorted(inserted)
+
+        # A row (from_customuser=A, to_customuser=B) means B follows A.
+        table, followed, follower = self._follow_columns(connection)
+        rows = ', '.join(['(%s, %s)'] * len(user_ids))
+        params = [value for pk in user_ids for value in (pk, self.pk)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({followed}, {follower}) VALUES {rows} '
+                f'ON CONFLICT DO NOTHING RETURNING {followed}',
+                params,
+            )
+            return sorted(row[0] for row in cursor.fetchall())
+
+    def _delete_follows(self, user_ids):
+        """Unfollow `user_ids`, returning the sorted ids whose rows this call deleted"""
+        Follow = CustomUser.followers.through
+        using = router.db_for_write(Follow)
+        connection = connections[using]
+        if not connection.features.can_return_columns_from_insert:
+            return sorted(
+                pk for pk in user_ids
+                if Follow.objects.using(using).filter(from_customuser=pk, to_customuser=self.pk).delete()[0]
+            )
+
+        table, followed, follower = self._follow_columns(connection)
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {follower} = %s AND {followed} IN ({placeholders}) '
+                f'RETURNING {followed}',
+                [self.pk, *user_ids],
+            )
+            return sorted(row[0] for row in cursor.fetchall())
+
+    @staticmethod
+    def _follow_columns(connection):
+        Follow = CustomUser.followers.through
+        quote = connection.ops.quote_name
+        return (
+            quote(Follow._meta.db_table),
+            quote(Follow._meta.get_field('from_customuser').column),
+            quote(Follow._meta.get_field('to_customuser').column),
+        )
+
+    def _follow_state(self, user_ids):
+        """Split user_ids into (following, not_following, skipped) with one query"""
+        wanted = set(user_ids) - {self.pk}
+        Follow = CustomUser.followers.through
+        # A row (from_customuser=A, to_customuser=B) means B follows A.
+        rows = CustomUser.objects.filter(pk__in=wanted).annotate(
+            followed=Exists(Follow.objects.filter(from_customuser=OuterRef('pk'),
+                                                  to_customuser=self.pk))
+        ).order_by('pk').values_list('pk', 'followed')
+        following, not_following = [], []
+        for pk, followed in rows:
+            (following if followed else not_following).append(pk)
+        skipped = sorted(set(user_ids) - set(following) - set(not_following))
+        return following, not_following, skipped
+
+    def _adjust_bulk_follow_counts(self, user_ids, delta):
+        from .authentication import invalidate_user
+        CustomUser.objects.filter(pk=self.pk).increment('following_count', delta * len(user_ids))
+        CustomUser.objects.filter(pk__in=user_ids).increment('followers_count', delta)
+        for pk in [self.pk, *user_ids]:
+            invalidate_user(pk)
+        self.following_count = max(self.following_count + delta * len(user_ids), 0)
+
+    def _adjust_follow_counts(self, user, delta):
+        from .authentication import invalidate_user
+        CustomUser.objects.filter(pk=self.pk).increment('following_count', delta)
+        CustomUser.objects.filter(pk=user.pk).increment('followers_count', delta)
+        # Cached request users carry the counters too
+        invalidate_user(self.pk)
+        invalidate_user(user.pk)
+        self.following_count = max(self.following_count + delta, 0)
+        user.followers_count = max(user.followers_count + delta, 0)
 
     def is_following(self, user):
         """Check if following a specific user"""
-        return self.following.filter(id=user.id).exists()
\ No newline at end of file
+        return graph.is_following(self, user)
+
+class UserRecommendation(models.Model):
+    """A precomputed "people you may know" entry, see accounts.recommendations"""
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='recommendations'
+    )
+    candidate = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    mutual_count = models.PositiveIntegerField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'candidate'], name='unique_recommendation'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-mutual_count', 'candidate'], name='recommendation_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.candidate} for {self.user} ({self.mutual_count} mutual)"
\ No newline at end of file
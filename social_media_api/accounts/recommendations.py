@@ -0,0 +1,150 @@
+"""
+"People you may know" recommendations.
+
+A candidate for user A is anyone followed by someone A follows, ranked by
+how many of A's followees follow them (the mutual count). A itself and
+accounts A already follows are excluded.
+
+compute_recommendations() scores the whole follow graph from a snapshot
+of the followers through-table and stores the top RECOMMENDATIONS_TOP_K
+candidates per user in UserRecommendation. It only rewrites users whose
+list changed, so it is cheap to run periodically (the
+compute_recommendations management command). With NumPy and SciPy
+installed the scores are a sparse matrix product computed in row
+batches. Otherwise a pure-Python walk produces the same rankings.
+"""
+import heapq
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserRecommendation
+
+try:
+    import numpy as np
+    from scipy import sparse
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+
+def top_k():
+    return getattr(settings, 'RECOMMENDATIONS_TOP_K', 20)
+
+
+def load_edges():
+    """(follower_id, followee_id) pairs from the followers through-table"""
+    Follow = get_user_model().followers.through
+    # A row (from_customuser=A, to_customuser=B) means B follows A.
+    return list(Follow.objects.values_list('to_customuser', 'from_customuser').iterator())
+
+
+def rank(scores, k):
+    """Top k (candidate_id, mutual_count) pairs, ties broken by lowest id"""
+    return heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def score_python(edges, k, batch_size=1000):
+    """Yield {user_id: ranking} batches by walking followees of followees"""
+    following = defaultdict(set)
+    for follower, followee in edges:
+        following[follower].add(followee)
+
+    users = sorted(following)
+    for start in range(0, len(users), batch_size):
+        batch = {}
+        for user in users[start:start + batch_size]:
+            followed = following[user]
+            scores = Counter()
+            for followee in followed:
+                scores.update(following.get(followee, ()))
+            for excluded in followed | {user}:
+                scores.pop(excluded, None)
+            batch[user] = rank(scores, k)
+        yield batch
+
+
+def score_sparse(edges, k, batch_size=1000):
+    """Same as score_python, with F[batch] @ F over a CSR follow matrix"""
+    if not edges:
+        return
+    pairs = np.array(edges, dtype=np.int64)
+    ids, positions = np.unique(pairs, return_inverse=True)
+    positions = positions.reshape(pairs.shape)
+    size = len(ids)
+    follows = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (positions[:, 0], positions[:, 1])),
+        shape=(size, size),
+    )
+    follows.sum_duplicates()
+    follows.data[:] = 1
+
+    for start in range(0, size, batch_size):
+        rows = follows[start:start + batch_size]
+        scores = rows @ follows
+        # Drop the user themselves and accounts they already follow
+        own = sparse.eye(rows.shape[0], size, k=start, dtype=np.int32, format='csr')
+        scores = (scores - scores.multiply(rows) - scores.multiply(own)).tocsr()
+        scores.eliminate_zeros()
+
+        batch = {}
+        for offset in range(rows.shape[0]):
+            if not rows.indptr[offset + 1] - rows.indptr[offset]:
+                continue
+            row = slice(scores.indptr[offset], scores.indptr[offset + 1])
+            candidates = ids[scores.indices[row]]
+            counts = scores.data[row]
+            order = np.lexsort((candidates, -counts))[:k]
+            batch[int(ids[start + offset])] = [
+                (int(candidates[i]), int(counts[i])) for i in order
+            ]
+        yield batch
+
+
+def save_batch(batch, computed_at):
+    """Replace stored rankings that differ from `batch`; returns the number rewritten"""
+    stored = defaultdict(list)
+    for row in (UserRecommendation.objects.filter(user_id__in=batch)
+                .order_by('user_id', '-mutual_count', 'candidate_id')
+                .values_list('user_id', 'candidate_id', 'mutual_count')):
+        stored[row[0]].append((row[1], row[2]))
+
+    changed = [user for user, ranking in batch.items() if stored[user] != ranking]
+    if not changed:
+        return 0
+    with transaction.atomic():
+        UserRecommendation.objects.filter(user_id__in=changed).delete()
+        UserRecommendation.objects.bulk_create([
+            UserRecommendation(user_id=user, candidate_id=candidate,
+                               mutual_count=count, computed_at=computed_at)
+            for user in changed
+            for candidate, count in batch[user]
+        ])
+    return len(changed)
+
+
+def compute_recommendations(k=None, batch_size=1000, use_scipy=None):
+    """Recompute every user's recommendations; returns (users scored, users rewritten)"""
+    k = k or top_k()
+    if use_scipy is None:
+        use_scipy = SCIPY_AVAILABLE
+    edges = load_edges()
+    score = score_sparse if use_scipy else score_python
+    computed_at = timezone.now()
+
+    scored = rewritten = 0
+    seen = set()
+    for batch in score(edges, k, batch_size):
+        seen.update(batch)
+        scored += len(batch)
+        rewritten += save_batch(batch, computed_at)
+
+    # Users who stopped following anyone keep no stale suggestions
+    stored = set(UserRecommendation.objects.values_list('user_id', flat=True).distinct())
+    stale = sorted(stored - seen)
+    for start in range(0, len(stale), batch_size):
+        UserRecommendation.objects.filter(user_id__in=stale[start:start + batch_size]).delete()
+    return scored, rewritten + len(stale)
@@ -0,0 +1,56 @@
+"""
+User search.
+
+On SQLite the accounts_user_search FTS5 table (accounts.search_index)
+indexes username and bio, and every search term is matched as a prefix,
+so "ali dev" finds users named "alice" whose bio mentions "developer".
+Databases without that table fall back to username prefix and bio
+substring filters.
+
+The index is kept current by triggers on accounts_customuser. SQLite
+drops them whenever a migration rebuilds that table; a post_migrate
+handler in accounts.search_index puts them back, so migrations need not.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .search_index import SEARCH_TABLE
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 5
+
+_index_available = {}
+
+
+def search_terms(query):
+    return TERM_RE.findall(query or '')[:MAX_TERMS]
+
+
+def has_search_index(using):
+    if using not in _index_available:
+        connection = connections[using]
+        _index_available[using] = (
+            connection.vendor == 'sqlite'
+            and SEARCH_TABLE in connection.introspection.table_names()
+        )
+    return _index_available[using]
+
+
+def search_users(queryset, query):
+    """Narrow a user queryset to those matching every term of `query`"""
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    if has_search_index(queryset.db):
+        match = ' '.join('"{}"*'.format(term) for term in terms)
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match]
+        ))
+
+    for term in terms:
+        queryset = queryset.filter(Q(username__istartswith=term) | Q(bio__icontains=term))
+    return queryset
@@ -0,0 +1,23 @@
+"""
+SQLite full-text index for user search.
+
+An external-content FTS5 table over username and bio (see
+social_media_api.fts). Migration 0004 creates it; other databases fall
+back to the prefix filters in accounts.search.
+"""
+from social_media_api.fts import SearchIndex
+
+index = SearchIndex(
+    table='accounts_user_search',
+    content_table='accounts_customuser',
+    columns=('username', 'bio'),
+    migration=('accounts', '0004_user_search_index'),
+)
+
+SEARCH_TABLE = index.table
+TRIGGERS = index.triggers
+
+create_search_index = index.create
+drop_search_index = index.drop
+missing_triggers = index.missing_triggers
+restore_search_index = index.restore
@@ -2,7 +2,9 @@ from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
-from .models import CustomUser
+from .models import CustomUser, UserRecommendation
+from social_media_api.serializers import ExpandableFieldsMixin
+from .thumbnails import thumbnail_urls
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -42,16 +44,27 @@ class UserLoginSerializer(serializers.Serializer):
             return attrs
         raise serializers.ValidationError('Must include "username" and "password"')
 
-class UserProfileSerializer(serializers.ModelSerializer):
-    followers_count = serializers.ReadOnlyField()
-    following_count = serializers.ReadOnlyField()
-    is_following = serializers.SerializerMethodField()
+class AvatarField(serializers.Field):
+    """
+    Read-only {format: url} map of the profile picture thumbnail for
+    `size`; feeds and lists embed small avatars, profiles large ones.
+    """
 
-    class Meta:
-        model = CustomUser
-        fields = ('id', 'username', 'email', 'bio', 'profile_picture', 
-                 'followers_count', 'following_count', 'is_following', 'created_at')
-        read_only_fields = ('id', 'created_at')
+    def __init__(self, size='medium', **kwargs):
+        self.size = size
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, user):
+        urls = thumbnail_urls(user, self.size)
+        request = self.context.get('request')
+        if urls and request is not None:
+            urls = {fmt: request.build_absolute_uri(url) for fmt, url in urls.items()}
+        return urls
+
+class FollowStateMixin:
+    """Answer is_following from the viewer's cached follow graph"""
 
     def get_is_following(self, obj):
         request = self.context.get('request')
@@ -59,6 +72,16 @@ class UserProfileSerializer(serializers.ModelSerializer):
             return request.user.is_following(obj)
         return False
 
+class UserProfileSerializer(ExpandableFieldsMixin, FollowStateMixin, serializers.ModelSerializer):
+    is_following = serializers.SerializerMethodField()
+    avatar = AvatarField(size='large')
+
+    class Meta:
+        model = CustomUser
+        fields = ('id', 'username', 'email', 'bio', 'profile_picture', 'avatar',
+                 'followers_count', 'following_count', 'is_following', 'created_at')
+        read_only_fields = ('id', 'followers_count', 'following_count', 'created_at')
+
 class FollowSerializer(serializers.Serializer):
     user_id = serializers.IntegerField()
 
@@ -69,19 +92,34 @@ class FollowSerializer(serializers.Serializer):
             raise serializers.ValidationError("User does not exist.")
         return value
 
-class UserDiscoverySerializer(serializers.ModelSerializer):
+class BulkFollowSerializer(serializers.Serializer):
+    MAX_USERS = 100
+
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_USERS
+    )
+
+class UserSummarySerializer(UserProfileSerializer):
+    """UserProfileSerializer with a small avatar, for users embedded in other objects"""
+    avatar = AvatarField(size='small')
+
+class UserDiscoverySerializer(ExpandableFieldsMixin, FollowStateMixin, serializers.ModelSerializer):
     """Simplified serializer for user discovery/list views"""
-    followers_count = serializers.ReadOnlyField()
-    following_count = serializers.ReadOnlyField()
     is_following = serializers.SerializerMethodField()
+    avatar = AvatarField(size='medium')
 
     class Meta:
         model = CustomUser
-        fields = ('id', 'username', 'bio', 'profile_picture', 
+        fields = ('id', 'username', 'bio', 'profile_picture', 'avatar', 
                  'followers_count', 'following_count', 'is_following')
+        read_only_fields = fields
 
-    def get_is_following(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user.is_following(obj)
-        return False
\ No newline at end of file
+class UserRecommendationSerializer(serializers.ModelSerializer):
+    user = UserDiscoverySerializer(source='candidate', read_only=True)
+
+    class Meta:
+        model = UserRecommendation
+        fields = ('user', 'mutual_count', 'computed_at')
+        read_only_fields = fields
\ No newline at end of file
@@ -1,11 +1,41 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+from io import BytesIO, StringIO
+from PIL import Image
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
-from posts.models import Post
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from posts.models import Post, FeedEntry
+from .authentication import (CachedTokenAuthentication, cache_stats, invalidate_user,
+                             remember, token_cache)
+from .models import UserRecommendation
+from .recommendations import compute_recommendations
+from .thumbnails import thumbnail_name
+from social_media_api import health
 
 User = get_user_model()
 
+# Versioned caches are only used when every worker shares the cache
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'social-media-api-test-cache'),
+    }
+}
+
+# Notifications are written in the test's own thread and transaction
+INLINE_NOTIFICATIONS = {'BACKEND': 'notifications.services.InlineBackend'}
+
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
 class FollowTests(APITestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(
@@ -41,6 +71,380 @@ class FollowTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertFalse(self.user1.is_following(self.user2))
         self.assertEqual(response.data['following'], False)
+    
+    def test_bulk_follow_and_unfollow(self):
+        cache.clear()
+        others = [User.objects.create_user(username=f'bulk{i}', password='testpass123')
+                  for i in range(3)]
+        Post.objects.create(author=others[0], title='Hello', content='Content')
+        self.user1.follow(self.user2)
+        ids = [self.user2.id, self.user1.id, 99999] + [user.id for user in others]
+        
+        response = self.client.post('/api/auth/follow/bulk/', {'user_ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['followed'], [user.id for user in others])
+        self.assertEqual(response.data['already_following'], [self.user2.id])
+        self.assertEqual(response.data['skipped'], [self.user1.id, 99999])
+        self.assertEqual(response.data['following_count'], 4)
+        self.assertEqual(response.data['followers_counts'],
+                         [{'id': user.id, 'followers_count': 1} for user in others])
+        self.assertTrue(self.user1.is_following(others[2]))
+        self.assertEqual(User.objects.get(pk=self.user1.pk).following_count, 4)
+        self.assertEqual(FeedEntry.objects.filter(owner=self.user1).count(), 1)
+        
+        response = self.client.post('/api/auth/unfollow/bulk/',
+                                    {'user_ids': [others[0].id, others[1].id, 99999]},
+                                    format='json')
+        self.assertEqual(response.data['unfollowed'], [others[0].id, others[1].id])
+        self.assertEqual(response.data['skipped'], [99999])
+        self.assertEqual(response.data['following_count'], 2)
+        self.assertEqual(response.data['followers_counts'],
+                         [{'id': others[0].id, 'followers_count': 0},
+                          {'id': others[1].id, 'followers_count': 0}])
+        self.assertFalse(self.user1.is_following(others[0]))
+        self.assertEqual(FeedEntry.objects.filter(owner=self.user1).count(), 0)
+    
+    def test_follow_counts_only_rows_actually_written(self):
+        others = [User.objects.create_user(username=f'race{i}', password='testpass123')
+                  for i in range(2)]
+        # Another request followed others[0] after this one read the follow state
+        with mock.patch.object(User, '_follow_state',
+                               return_value=([], [user.id for user in others], [])):
+            self.user1.follow(others[0])
+            followed, already, _ = self.user1.follow_many([user.id for user in others])
+        self.assertEqual(followed, [others[1].id])
+        self.assertEqual(already, [others[0].id])
+        self.assertFalse(self.user1.follow(others[0]))
+        
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.following_count, 2)
+        self.assertEqual([User.objects.get(pk=user.pk).followers_count for user in others], [1, 1])
+        self.assertTrue(self.user1.unfollow(others[0]))
+        self.assertFalse(self.user1.unfollow(others[0]))
+        self.assertEqual(User.objects.get(pk=others[0].pk).followers_count, 0)
+    
+    def test_bulk_follow_validates_ids(self):
+        response = self.client.post('/api/auth/follow/bulk/', {'user_ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/auth/follow/bulk/',
+                                    {'user_ids': list(range(1, 102))}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+@override_settings(CACHES=SHARED_CACHES, NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class FollowGraphCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.others = [
+            User.objects.create_user(username=f'writer{i}', password='testpass123')
+            for i in range(3)
+        ]
+    
+    def test_following_set_is_loaded_once(self):
+        self.user.follow(self.others[0])
+        reader = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(reader.is_following(self.others[0]))
+            self.assertFalse(reader.is_following(self.others[1]))
+        
+        # A fresh instance (next request) reads the cached set
+        reader = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(reader.is_following(self.others[0]))
+    
+    def test_follow_and_unfollow_invalidate(self):
+        self.assertFalse(self.user.is_following(self.others[1]))
+        self.user.follow(self.others[1])
+        self.assertTrue(self.user.is_following(self.others[1]))
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_following(self.others[1]))
+        
+        self.user.unfollow(self.others[1])
+        self.assertFalse(self.user.is_following(self.others[1]))
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_following(self.others[1]))
+    
+    def test_process_local_cache_expires(self):
+        self.user.follow(self.others[0])
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}, LOCAL_CACHE_TTL=5):
+            User.objects.get(pk=self.user.pk).is_following(self.others[0])
+            reader = User.objects.get(pk=self.user.pk)
+            with self.assertNumQueries(0):
+                self.assertTrue(reader.is_following(self.others[0]))
+            
+            # Expiry bounds how stale another worker's copy can get
+            reader = User.objects.get(pk=self.user.pk)
+            with mock.patch('time.time', return_value=time.time() + 6), self.assertNumQueries(1):
+                self.assertTrue(reader.is_following(self.others[0]))
+
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class RecommendationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.viewer, self.b1, self.b2, self.c1, self.c2 = [
+            User.objects.create_user(username=name, password='testpass123')
+            for name in ('viewer', 'b1', 'b2', 'c1', 'c2')
+        ]
+        self.viewer.follow(self.b1)
+        self.viewer.follow(self.b2)
+        self.b1.follow(self.c1)
+        self.b1.follow(self.c2)
+        self.b2.follow(self.c1)
+        self.b2.follow(self.viewer)
+        self.client.force_authenticate(user=self.viewer)
+    
+    def ranking(self, user):
+        return list(UserRecommendation.objects.filter(user=user)
+                    .order_by('-mutual_count', 'candidate_id')
+                    .values_list('candidate__username', 'mutual_count'))
+    
+    def test_ranks_friends_of_friends_by_mutual_count(self):
+        compute_recommendations()
+        self.assertEqual(self.ranking(self.viewer), [('c1', 2), ('c2', 1)])
+        # b2 follows viewer, who follows b1
+        self.assertEqual(self.ranking(self.b2), [('b1', 1)])
+        
+        response = self.client.get('/api/auth/recommendations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(r['user']['username'], r['mutual_count']) for r in response.data],
+                         [('c1', 2), ('c2', 1)])
+        
+        # Followed since the last run: hidden right away
+        self.viewer.follow(self.c1)
+        response = self.client.get('/api/auth/recommendations/')
+        self.assertEqual([r['user']['username'] for r in response.data], ['c2'])
+    
+    def test_only_changed_lists_are_rewritten(self):
+        # b1's followees follow nobody, so it has nothing to store
+        self.assertEqual(compute_recommendations(), (3, 2))
+        self.assertEqual(compute_recommendations(), (3, 0))
+        
+        self.viewer.unfollow(self.b2)
+        out = StringIO()
+        call_command('compute_recommendations', stdout=out)
+        self.assertIn('rewrote 1 recommendation list(s)', out.getvalue())
+        self.assertEqual(self.ranking(self.viewer), [('c1', 1), ('c2', 1)])
+        
+        self.b2.unfollow(self.c1)
+        self.b2.unfollow(self.viewer)
+        compute_recommendations()
+        self.assertEqual(self.ranking(self.b2), [])
+
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class TokenCacheTests(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(username='member', password='testpass123')
+        response = self.client.post('/api/auth/login/',
+                                    {'username': 'member', 'password': 'testpass123'})
+        self.key = response.data['token']
+        self.auth = CachedTokenAuthentication()
+    
+    def test_login_primes_cache(self):
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.key)
+        self.assertTrue(user.check_password('testpass123'))
+        
+        response = self.client.get('/api/auth/profile/', HTTP_AUTHORIZATION=f'Token {self.key}')
+        self.assertEqual(response.data['username'], 'member')
+        self.assertEqual(cache_stats()['hits'], 2)
+        self.assertEqual(cache_stats()['hit_rate'], 1.0)
+    
+    def test_invalidated_on_user_changes(self):
+        self.user.set_password('changed123')
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.key)
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials(self.key)
+        
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+    
+    def test_invalidated_on_token_delete(self):
+        Token.objects.filter(key=self.key).delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+    
+    @override_settings(CACHES=SHARED_CACHES, TOKEN_AUTH_CACHE={'SHARED_CACHE': 'default'})
+    def test_invalidation_reaches_other_processes(self):
+        cache.clear()
+        self.auth.authenticate_credentials(self.key)
+        with self.assertNumQueries(0):
+            self.auth.authenticate_credentials(self.key)
+        
+        # Another worker deactivates the user; only the shared cache hears of it
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with mock.patch.object(token_cache, 'delete_user'):
+            invalidate_user(self.user.pk)
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+    
+    def test_follow_counters_stay_fresh(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.user.follow(other)
+        user, token = self.auth.authenticate_credentials(self.key)
+        self.assertEqual(user.following_count, 1)
+    
+    def test_invalidated_again_on_commit(self):
+        stale = User.objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.is_active = False
+            self.user.save()
+        # A concurrent request re-primes the cache with the row it read before the commit
+        remember(self.key, stale)
+        for callback in callbacks:
+            callback()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+    
+    def test_options_read_on_use(self):
+        token_cache.clear()
+        with override_settings(TOKEN_AUTH_CACHE={'TTL': 0}):
+            self.auth.authenticate_credentials(self.key)
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.key)
+    
+    def test_stats_for_staff_only(self):
+        url = '/api/auth/token-cache/'
+        response = self.client.get(url, HTTP_AUTHORIZATION=f'Token {self.key}')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertNotIn('token_cache', self.client.get('/api/auth/health/').json())
+        
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        invalidate_user(self.user.pk)
+        response = self.client.get(url, HTTP_AUTHORIZATION=f'Token {self.key}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('hit_rate', response.data)
+
+class ThumbnailTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            THUMBNAILS={'BACKEND': 'accounts.thumbnails.InlineBackend',
+                        'SIZES': {'small': 32, 'medium': 64, 'large': 96}},
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.user = User.objects.create_user(username='pictured', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+    
+    def upload(self, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), color).save(buffer, format='PNG')
+        picture = SimpleUploadedFile('me.png', buffer.getvalue(), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put('/api/auth/profile/', {'profile_picture': picture},
+                                   format='multipart')
+    
+    def test_thumbnails_rendered_after_upload(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The response is built before the worker runs
+        self.assertTrue(response.data['avatar']['webp'].endswith('.png'))
+        
+        self.user.refresh_from_db()
+        digest = self.user.profile_picture_hash
+        self.assertEqual(len(digest), 32)
+        for size, pixels in (('small', 32), ('large', 96)):
+            for fmt in ('webp', 'jpeg'):
+                path = os.path.join(self.media_root, thumbnail_name(digest, size, fmt))
+                with Image.open(path) as image:
+                    self.assertEqual(image.size, (pixels, pixels))
+        
+        response = self.client.get('/api/auth/profile/')
+        self.assertTrue(response.data['avatar']['webp'].endswith(f'{digest}-96.webp'))
+        self.assertTrue(response.data['avatar']['jpeg'].endswith(f'{digest}-96.jpg'))
+        
+        Post.objects.create(author=self.user, title='Hi', content='Content')
+        response = self.client.get('/api/posts/')
+        author = response.data['results'][0]['author_details']
+        self.assertTrue(author['avatar']['webp'].endswith(f'{digest}-32.webp'))
+    
+    def test_identical_images_share_thumbnails(self):
+        self.upload()
+        self.user.refresh_from_db()
+        first = self.user.profile_picture_hash
+        other = User.objects.create_user(username='twin', password='testpass123')
+        self.client.force_authenticate(user=other)
+        self.upload()
+        other.refresh_from_db()
+        self.assertEqual(other.profile_picture_hash, first)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, 'thumbs', first[:2]))), 6)
+
+class HealthProbeTests(TestCase):
+    def setUp(self):
+        health.reset_cache()
+        self.addCleanup(health.reset_cache)
+    
+    def test_live(self):
+        response = self.client.get('/live')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'alive')
+    
+    def test_ready_reports_checks_and_caches(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with self.settings(MEDIA_ROOT=media_root):
+            response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(payload['status'], 'ready')
+        self.assertFalse(payload['cached'])
+        self.assertIn('default', payload['checks']['database']['latency_ms'])
+        self.assertTrue(payload['checks']['migrations']['ok'])
+        self.assertIn('notifications', payload['checks']['queues']['backlog'])
+        
+        check = mock.Mock(return_value={})
+        with mock.patch.object(health, 'READINESS_CHECKS', [('database', check, True)]):
+            response = self.client.get('/ready/')
+        self.assertTrue(response.json()['cached'])
+        self.assertFalse(check.called)
+    
+    @override_settings(HEALTH_CHECK_TIMEOUT=0.1)
+    def test_slow_or_failing_checks(self):
+        def slow():
+            time.sleep(0.5)
+            return {}
+        
+        checks = [
+            ('database', slow, True),
+            ('storage', mock.Mock(side_effect=OSError('no media')), False),
+        ]
+        with mock.patch.object(health, 'READINESS_CHECKS', checks):
+            response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 503)
+        payload = response.json()
+        self.assertEqual(payload['status'], 'unavailable')
+        self.assertIn('timed out', payload['checks']['database']['error'])
+        self.assertEqual(payload['checks']['storage']['error'], 'no media')
+        
+        health.reset_cache()
+        with mock.patch.object(health, 'READINESS_CHECKS', checks[1:]):
+            response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'degraded')
+
+class DatabaseProfileTests(TestCase):
+    def test_health_check(self):
+        response = self.client.get('/api/auth/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'healthy')
+        self.assertEqual(self.client.post('/api/auth/health/').status_code, 405)
+    
+    def test_sqlite_pragmas_and_pool_report(self):
+        out = StringIO()
+        call_command('db_pool_status', stdout=out)
+        report = out.getvalue()
+        self.assertIn('worker(s)', report)
+        self.assertIn('[default] sqlite', report)
+        self.assertIn('synchronous=1', report)
+        self.assertIn('busy_timeout=5000', report)
 
 class UserListViewTests(APITestCase):
     def setUp(self):
@@ -60,8 +464,57 @@ class UserListViewTests(APITestCase):
         url = '/api/auth/users/'
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['count'], 1)  # Should exclude current user
-        self.assertEqual(response.data['users'][0]['username'], 'user2')
+        self.assertEqual(len(response.data['results']), 1)  # Should exclude current user
+        self.assertEqual(response.data['results'][0]['username'], 'user2')
+        self.assertNotIn('email', response.data['results'][0])
+    
+    def test_user_list_pages_with_cursor(self):
+        for i in range(3):
+            User.objects.create_user(username=f'extra{i}', password='testpass123')
+        response = self.client.get('/api/auth/users/?page_size=2')
+        names = [user['username'] for user in response.data['results']]
+        self.assertEqual(names, ['extra2', 'extra1'])
+        
+        response = self.client.get(response.data['next'])
+        names = [user['username'] for user in response.data['results']]
+        self.assertEqual(names, ['extra0', 'user2'])
+        self.assertIsNone(response.data['next'])
+        
+        response = self.client.get('/api/auth/users/?paginate=page')
+        self.assertEqual(response.data['count'], 4)
+    
+    def test_user_search(self):
+        User.objects.create_user(username='alice', password='testpass123',
+                                 bio='Backend developer')
+        User.objects.create_user(username='alfred', password='testpass123', bio='Gardener')
+        
+        response = self.client.get('/api/auth/users/?search=al')
+        self.assertEqual({u['username'] for u in response.data['results']}, {'alice', 'alfred'})
+        
+        response = self.client.get('/api/auth/users/?search=al dev')
+        self.assertEqual([u['username'] for u in response.data['results']], ['alice'])
+        
+        # The index follows profile edits
+        self.user2.bio = 'Developer advocate'
+        self.user2.save()
+        response = self.client.get('/api/auth/users/?search=develop')
+        self.assertEqual({u['username'] for u in response.data['results']}, {'alice', 'user2'})
+    
+    def test_search_index_is_restored_after_migrate(self):
+        from django.db import connection
+        from .search_index import TRIGGERS, missing_triggers, restore_search_index
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        # Migration 0006 rebuilt accounts_customuser; post_migrate put the triggers back
+        self.assertEqual(missing_triggers(connection), [])
+        
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {TRIGGERS[0]}')
+        restore_search_index(sender=None, using='default')
+        self.assertEqual(missing_triggers(connection), [])
+        User.objects.create_user(username='zelda', password='testpass123')
+        response = self.client.get('/api/auth/users/?search=zel')
+        self.assertEqual([u['username'] for u in response.data['results']], ['zelda'])
     
     def test_user_detail_view(self):
         url = f'/api/auth/users/{self.user2.id}/'
@@ -69,6 +522,7 @@ class UserListViewTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['username'], 'user2')
 
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
 class FeedTests(APITestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(
@@ -0,0 +1,197 @@
+"""
+Profile picture thumbnails.
+
+After an upload, schedule_thumbnails() queues the user once the
+transaction commits. A background worker then renders a square
+thumbnail for every size in THUMBNAILS['SIZES'], in every format in
+THUMBNAILS['FORMATS'], and stores them under content-hash names:
+
+    thumbs/ab/ab12...ef-128.webp
+
+Identical images share their files, and existing files are never
+rendered twice. When the set is complete the worker records the hash on
+the user (profile_picture_hash). Serializers then link the variant that
+fits their context (see AvatarField in accounts.serializers) and keep
+linking the original until then. The backend is chosen by
+THUMBNAILS['BACKEND']:
+
+    accounts.thumbnails.ThreadedBackend  background worker thread (default)
+    accounts.thumbnails.InlineBackend    renders in the calling thread
+"""
+import atexit
+import hashlib
+import io
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'accounts.thumbnails.ThreadedBackend',
+    'SIZES': {'small': 64, 'medium': 128, 'large': 400},
+    'FORMATS': ['webp', 'jpeg'],
+    'QUALITY': 80,
+    'DIRECTORY': 'thumbs',
+}
+
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'THUMBNAILS', {})}
+
+
+def get_backend():
+    options = get_options()
+    path = options['BACKEND']
+    with _backends_lock:
+        if path not in _backends:
+            _backends[path] = import_string(path)(options)
+        return _backends[path]
+
+
+def thumbnail_name(digest, size, fmt):
+    options = get_options()
+    pixels = options['SIZES'][size]
+    return f"{options['DIRECTORY']}/{digest[:2]}/{digest}-{pixels}.{EXTENSIONS[fmt]}"
+
+
+def thumbnail_urls(user, size):
+    """{format: url} for a user's avatar at `size`, the original until thumbnails exist"""
+    if not user.profile_picture:
+        return None
+    formats = get_options()['FORMATS']
+    if not user.profile_picture_hash:
+        return {fmt: user.profile_picture.url for fmt in formats}
+    return {
+        fmt: default_storage.url(thumbnail_name(user.profile_picture_hash, size, fmt))
+        for fmt in formats
+    }
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def render(image, pixels, fmt, quality):
+    thumbnail = ImageOps.fit(image, (pixels, pixels), Image.LANCZOS)
+    if fmt == 'jpeg' and thumbnail.mode not in ('RGB', 'L'):
+        thumbnail = thumbnail.convert('RGB')
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format=fmt.upper(), quality=quality)
+    return buffer.getvalue()
+
+
+def generate_thumbnails(user_id):
+    """Render and store every missing variant, then record the hash on the user"""
+    from .authentication import invalidate_user
+    from .models import CustomUser
+
+    user = CustomUser.objects.filter(pk=user_id).only('id', 'profile_picture').first()
+    if user is None or not user.profile_picture:
+        return None
+
+    name = user.profile_picture.name
+    with user.profile_picture.open('rb') as source:
+        data = source.read()
+    digest = content_hash(data)
+
+    options = get_options()
+    image = None
+    for size in options['SIZES']:
+        for fmt in options['FORMATS']:
+            path = thumbnail_name(digest, size, fmt)
+            if default_storage.exists(path):
+                continue
+            if image is None:
+                image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+            default_storage.save(path, ContentFile(
+                render(image, options['SIZES'][size], fmt, options['QUALITY'])
+            ))
+
+    # Skip if another upload replaced the picture meanwhile
+    CustomUser.objects.filter(pk=user_id, profile_picture=name).update(profile_picture_hash=digest)
+    invalidate_user(user_id)
+    return digest
+
+
+def schedule_thumbnails(user):
+    """Queue thumbnail generation for a new profile picture after commit"""
+    from .authentication import invalidate_user
+    from .models import CustomUser
+
+    # Until the worker finishes, serializers fall back to the original
+    CustomUser.objects.filter(pk=user.pk).update(profile_picture_hash='')
+    invalidate_user(user.pk)
+    user.profile_picture_hash = ''
+    if user.profile_picture:
+        backend = get_backend()
+        transaction.on_commit(lambda: backend.enqueue(user.pk))
+
+
+class InlineBackend:
+    """Renders immediately; useful for tests and management commands"""
+
+    def __init__(self, options):
+        pass
+
+    def enqueue(self, user_id):
+        generate_thumbnails(user_id)
+
+    def flush(self):
+        pass
+
+    def pending(self):
+        return 0
+
+
+class ThreadedBackend:
+    """Renders thumbnails on a daemon worker thread, off the request path"""
+
+    def __init__(self, options):
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def enqueue(self, user_id):
+        self._ensure_worker()
+        self.queue.put(user_id)
+
+    def flush(self):
+        """Block until every queued picture has been processed"""
+        if self._thread is not None:
+            self.queue.join()
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='thumbnail-worker', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            user_id = self.queue.get()
+            try:
+                generate_thumbnails(user_id)
+            except Exception:
+                logger.exception('Failed to render thumbnails for user %s', user_id)
+            finally:
+                close_old_connections()
+                self.queue.task_done()
@@ -1,7 +1,9 @@
 from django.urls import path
 from .views import (UserRegistrationView, UserLoginView, UserProfileView,
                    FollowUserView, UnfollowUserView, UserFollowingListView,
-                   UserFollowersListView, UserListView, UserDetailView, health_check)
+                   UserFollowersListView, UserListView, UserDetailView,
+                   UserRecommendationListView, BulkFollowView, BulkUnfollowView, TokenCacheStatsView,
+                   health_check)
 
 urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='register'),
@@ -9,9 +11,13 @@ urlpatterns = [
     path('profile/', UserProfileView.as_view(), name='profile'),
     path('follow/<int:user_id>/', FollowUserView.as_view(), name='follow-user'),
     path('unfollow/<int:user_id>/', UnfollowUserView.as_view(), name='unfollow-user'),
+    path('follow/bulk/', BulkFollowView.as_view(), name='bulk-follow'),
+    path('unfollow/bulk/', BulkUnfollowView.as_view(), name='bulk-unfollow'),
     path('following/', UserFollowingListView.as_view(), name='following-list'),
     path('followers/', UserFollowersListView.as_view(), name='followers-list'),
     path('users/', UserListView.as_view(), name='user-list'),  # New endpoint
     path('users/<int:user_id>/', UserDetailView.as_view(), name='user-detail'),  # New endpoint
+    path('recommendations/', UserRecommendationListView.as_view(), name='user-recommendations'),
+    path('token-cache/', TokenCacheStatsView.as_view(), name='token-cache-stats'),
     path('health/', health_check, name='health-check'),
 ]
\ No newline at end of file
@@ -4,40 +4,63 @@ from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from django.shortcuts import get_object_or_404
-from .models import CustomUser
+from .models import CustomUser, UserRecommendation
 from .serializers import (UserRegistrationSerializer, UserLoginSerializer, 
-                         UserProfileSerializer, FollowSerializer)
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+                         UserProfileSerializer, FollowSerializer, UserDiscoverySerializer,
+                         UserRecommendationSerializer, BulkFollowSerializer)
+from .graph import following_ids
+from .authentication import cache_stats, remember
+from .search import search_users
+from .thumbnails import schedule_thumbnails
+from social_media_api.pagination import KeysetPagination
+from asgiref.sync import sync_to_async
 from django.db import connection
+from django.http import JsonResponse
 from django.utils import timezone
 import os
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def health_check(request):
-    """Health check endpoint for monitoring"""
+def ping_database():
     try:
-        # Check database connection
         with connection.cursor() as cursor:
             cursor.execute("SELECT 1")
+    finally:
+        # Runs on a pool thread; don't leave its connection behind
+        connection.close()
+
+async def health_check(request):
+    """
+    Health check endpoint for monitoring. Async, so under ASGI workers it
+    answers without queueing behind the thread that serves sync views.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    try:
+        # Check database connection
+        await sync_to_async(ping_database, thread_sensitive=False)()
         
-        return Response({
+        return JsonResponse({
             'status': 'healthy',
             'database': 'connected',
             'environment': os.environ.get('DJANGO_ENVIRONMENT', 'development'),
             'timestamp': timezone.now().isoformat()
         })
     except Exception as e:
-        return Response({
+        return JsonResponse({
             'status': 'unhealthy',
             'error': str(e),
             'timestamp': timezone.now().isoformat()
         }, status=500)
 
+class TokenCacheStatsView(APIView):
+    """Per-process token cache hit rate, for staff only"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
 # Import notifications only if the app is installed
 try:
-    from notifications.models import Notification
+    from notifications.services import notify, notify_many
     NOTIFICATIONS_ENABLED = True
 except ImportError:
     NOTIFICATIONS_ENABLED = False
@@ -49,7 +72,10 @@ class UserRegistrationView(APIView):
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
+            if user.profile_picture:
+                schedule_thumbnails(user)
             token, created = Token.objects.get_or_create(user=user)
+            remember(token.key, user)
             return Response({
                 'message': 'User registered successfully',
                 'user': {
@@ -69,6 +95,7 @@ class UserLoginView(APIView):
         if serializer.is_valid():
             user = serializer.validated_data['user']
             token, created = Token.objects.get_or_create(user=user)
+            remember(token.key, user)
             return Response({
                 'message': 'Login successful',
                 'user': {
@@ -90,7 +117,9 @@ class UserProfileView(APIView):
     def put(self, request):
         serializer = UserProfileSerializer(request.user, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            user = serializer.save()
+            if 'profile_picture' in serializer.validated_data:
+                schedule_thumbnails(user)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -109,11 +138,7 @@ class FollowUserView(APIView):
         if request.user.follow(target_user):
             # Create notification for the followed user using direct creation
             if NOTIFICATIONS_ENABLED:
-                Notification.objects.create(
-                    recipient=target_user,
-                    actor=request.user,
-                    verb='follow'
-                )
+                notify(target_user, request.user, 'follow')
             
             return Response({
                 'message': f'You are now following {target_user.username}',
@@ -144,6 +169,45 @@ class UnfollowUserView(APIView):
                 'error': f'You are not following {target_user.username}'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+class BulkFollowView(APIView):
+    """Follow up to BulkFollowSerializer.MAX_USERS users in one request"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        followed, already, skipped = request.user.follow_many(serializer.validated_data['user_ids'])
+        targets = CustomUser.objects.filter(pk__in=followed).order_by('pk').only('id', 'followers_count')
+        targets = list(targets)
+        if NOTIFICATIONS_ENABLED:
+            notify_many([(target, request.user, 'follow', None) for target in targets])
+        return Response({
+            'followed': followed,
+            'already_following': already,
+            'skipped': skipped,
+            'followers_counts': [
+                {'id': target.pk, 'followers_count': target.followers_count} for target in targets
+            ],
+            'following_count': request.user.following_count
+        }, status=status.HTTP_200_OK)
+
+class BulkUnfollowView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        unfollowed, not_following, skipped = request.user.unfollow_many(
+            serializer.validated_data['user_ids'])
+        targets = CustomUser.objects.filter(pk__in=unfollowed).order_by('pk').values('id', 'followers_count')
+        return Response({
+            'unfollowed': unfollowed,
+            'not_following': not_following,
+            'skipped': skipped,
+            'followers_counts': list(targets),
+            'following_count': request.user.following_count
+        }, status=status.HTTP_200_OK)
+
 class UserFollowingListView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserProfileSerializer
@@ -168,18 +232,39 @@ class UserFollowersListView(generics.GenericAPIView):
             'followers': serializer.data
         })
 
-class UserListView(generics.GenericAPIView):
-    """View for listing all users (for discovery)"""
+class UserListView(generics.ListAPIView):
+    """
+    View for listing all users (for discovery), newest first in keyset
+    pages. ?search= matches username and bio prefixes.
+    """
     permission_classes = [permissions.IsAuthenticated]
-    serializer_class = UserProfileSerializer
+    serializer_class = UserDiscoverySerializer
+    pagination_class = KeysetPagination
+    replica_actions = ('get',)
 
-    def get(self, request):
-        users = CustomUser.objects.all().exclude(id=request.user.id)
-        serializer = self.get_serializer(users, many=True, context={'request': request})
-        return Response({
-            'count': users.count(),
-            'users': serializer.data
-        })
+    def get_queryset(self):
+        users = (CustomUser.objects.exclude(id=self.request.user.id)
+                 .only('id', 'username', 'bio', 'profile_picture', 'profile_picture_hash',
+                       'followers_count',
+                       'following_count', 'created_at')
+                 .order_by('-created_at', '-id'))
+        return search_users(users, self.request.query_params.get('search'))
+
+class UserRecommendationListView(generics.ListAPIView):
+    """
+    "People you may know": friends of friends ranked by mutual follows,
+    precomputed by the compute_recommendations command
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = UserRecommendationSerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        # Skip anyone followed since the last run
+        return (UserRecommendation.objects.filter(user=self.request.user)
+                .exclude(candidate_id__in=following_ids(self.request.user))
+                .select_related('candidate')
+                .order_by('-mutual_count', 'candidate_id'))
 
 class UserDetailView(generics.GenericAPIView):
     """View for getting specific user details"""
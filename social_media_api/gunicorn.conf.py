@@ -1,10 +1,32 @@
 import multiprocessing
+import os
+
+# Serving profile, selected with GUNICORN_PROFILE:
+#   sync     one request at a time per worker process (default)
+#   gthread  GUNICORN_THREADS threads per worker
+#   uvicorn  ASGI workers over social_media_api.asgi (requires uvicorn);
+#            async views (notification stream, feed, unread count, health
+#            check) wait without holding a worker
+# Compare them with scripts/load_test.py.
+profile = os.environ.get("GUNICORN_PROFILE", "sync")
 
 bind = "0.0.0.0:8000"
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
-worker_connections = 1000
+# Keep in sync with DATABASE_POOL in settings/base.py
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
 timeout = 30
 max_requests = 1000
 max_requests_jitter = 100
-preload_app = True
\ No newline at end of file
+preload_app = True
+
+if profile == "sync":
+    worker_class = "sync"
+    wsgi_app = "social_media_api.wsgi:application"
+elif profile == "gthread":
+    worker_class = "gthread"
+    threads = int(os.environ.get("GUNICORN_THREADS", 4))
+    wsgi_app = "social_media_api.wsgi:application"
+elif profile == "uvicorn":
+    worker_class = "uvicorn.workers.UvicornWorker"
+    wsgi_app = "social_media_api.asgi:application"
+else:
+    raise RuntimeError(f"Unknown GUNICORN_PROFILE {profile!r}; use sync, gthread or uvicorn")
@@ -0,0 +1,79 @@
+"""
+Cached unread-notification counters.
+
+The unread count for each user lives in the cache configured by
+NOTIFICATION_COUNTER_CACHE. It is filled from the database on a miss and
+kept current by increments and decrements, applied once the transaction
+that wrote or read the notifications commits, so a rollback never
+touches it. Each user also has a version number that changes whenever
+their notifications change, which the unread endpoint uses as its ETag.
+
+With a per-process cache (see social_media_api.caching) each worker
+keeps its own counters and versions for at most LOCAL_CACHE_TTL
+seconds, so a count or ETag can lag notifications written by another
+worker by that long.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from social_media_api.caching import bump_version, get_version, versioned_cache
+
+COUNT_KEY = 'notifications:unread:{}'
+VERSION_KEY = 'notifications:version:{}'
+TIMEOUT = 60 * 60
+
+
+def _cache():
+    return versioned_cache(getattr(settings, 'NOTIFICATION_COUNTER_CACHE', 'default'))
+
+
+def get_unread_count(user_id):
+    cache = _cache()
+    count = cache.get(COUNT_KEY.format(user_id)) if cache is not None else None
+    if count is None:
+        from .models import Notification
+        count = Notification.objects.filter(recipient_id=user_id, read=False).count()
+        if cache is not None:
+            cache.add(COUNT_KEY.format(user_id), count, TIMEOUT)
+    return count
+
+
+def adjust_unread(counts):
+    """Apply {user_id: delta} to cached counters once the transaction commits"""
+    if _cache() is not None:
+        transaction.on_commit(lambda: _apply(counts))
+
+
+def _apply(counts):
+    cache = _cache()
+    for user_id, delta in counts.items():
+        if delta:
+            key = COUNT_KEY.format(user_id)
+            try:
+                if cache.incr(key, delta) < 0:
+                    cache.delete(key)
+            except ValueError:
+                # Not cached yet; the next read counts from the database
+                pass
+        bump_version(cache, VERSION_KEY.format(user_id))
+
+
+def reset_unread(user_id, count=0):
+    cache = _cache()
+    if cache is None:
+        return
+
+    def reset():
+        cache.set(COUNT_KEY.format(user_id), count, TIMEOUT)
+        bump_version(cache, VERSION_KEY.format(user_id))
+
+    transaction.on_commit(reset)
+
+
+def unread_etag(user_id):
+    """ETag for the user's unread endpoint, or None without a cache"""
+    cache = _cache()
+    if cache is None:
+        return None
+    version = get_version(cache, VERSION_KEY.format(user_id))
+    return f'W/"{get_unread_count(user_id)}-{version}"'
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_group_actors(apps, schema_editor):
+    # Only the recent actors of existing groups are known; groups still
+    # inside their window count from those once their next event arrives
+    NotificationGroup = apps.get_model('notifications', 'NotificationGroup')
+    NotificationGroupActor = apps.get_model('notifications', 'NotificationGroupActor')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    def write(pairs):
+        existing = set(User.objects.filter(pk__in={pk for _, pk in pairs}).values_list('pk', flat=True))
+        NotificationGroupActor.objects.bulk_create([
+            NotificationGroupActor(group_id=group_id, actor_id=pk)
+            for group_id, pk in pairs if pk in existing
+        ], ignore_conflicts=True)
+
+    pairs = []
+    for group in NotificationGroup.objects.only('id', 'recent_actors').iterator():
+        pairs.extend((group.pk, pk) for pk in group.recent_actors)
+        if len(pairs) >= 1000:
+            write(pairs)
+            pairs = []
+    write(pairs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0002_notificationgroup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationGroupActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actor_rows', to='notifications.notificationgroup')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='notificationgroupactor',
+            constraint=models.UniqueConstraint(fields=('group', 'actor'), name='unique_group_actor'),
+        ),
+        migrations.RunPython(fill_group_actors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:47
+
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def seed_acted_at(apps, schema_editor):
+    # Keep the order of each group's stored recent actors, newest first;
+    # everyone else counts as having acted when the window opened
+    NotificationGroup = apps.get_model('notifications', 'NotificationGroup')
+    NotificationGroupActor = apps.get_model('notifications', 'NotificationGroupActor')
+    for group in NotificationGroup.objects.only('id', 'window_start', 'timestamp', 'recent_actors').iterator():
+        NotificationGroupActor.objects.filter(group_id=group.pk).update(acted_at=group.window_start)
+        for index, pk in enumerate(group.recent_actors):
+            NotificationGroupActor.objects.filter(group_id=group.pk, actor_id=pk).update(
+                acted_at=group.timestamp - timedelta(microseconds=index)
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notificationgroupactor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationgroupactor',
+            name='acted_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(seed_acted_at, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='notificationgroup',
+            name='recent_actors',
+        ),
+        migrations.AddIndex(
+            model_name='notificationgroupactor',
+            index=models.Index(fields=['group', '-acted_at'], name='notif_group_actor_recent_idx'),
+        ),
+    ]
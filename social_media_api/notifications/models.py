@@ -54,12 +54,94 @@ class Notification(models.Model):
         return f"{self.actor.username} {self.verb} - {self.recipient.username}"
     
     def mark_as_read(self):
+        was_unread = not self.read
         self.read = True
         self.save()
+        if was_unread:
+            from .counters import adjust_unread
+            adjust_unread({self.recipient_id: -1})
     
     def save(self, *args, **kwargs):
         """Override save to handle target object automatically"""
         if self.target and not self.target_content_type_id:
             self.target_content_type = ContentType.objects.get_for_model(self.target)
             self.target_object_id = self.target.id
-        super().save(*args, **kwargs)
\ No newline at end of file
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding and not self.read:
+            from .counters import adjust_unread
+            adjust_unread({self.recipient_id: 1})
+
+class NotificationGroup(models.Model):
+    """
+    Aggregated notifications: one row per (recipient, verb, target) and time
+    window, e.g. "alice and 41 others liked your post". Rows are updated in
+    place as new actors arrive; actor_count and latest_actor are derived
+    from the actors recorded in NotificationGroupActor.
+    """
+    RECENT_ACTORS = 3
+    
+    group_key = models.CharField(max_length=100, unique=True)
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notification_groups'
+    )
+    verb = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    target_content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+    target = GenericForeignKey('target_content_type', 'target_object_id')
+    
+    window_start = models.DateTimeField()
+    actor_count = models.PositiveIntegerField(default=0)
+    latest_actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+'
+    )
+    read = models.BooleanField(default=False)
+    timestamp = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['recipient', '-timestamp'], name='notif_group_recent_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.verb} x{self.actor_count} - {self.recipient_id}"
+    
+    @staticmethod
+    def make_key(recipient_id, verb, content_type_id, object_id, window_start):
+        return f"{recipient_id}:{verb}:{content_type_id or 0}:{object_id or 0}:{int(window_start.timestamp())}"
+
+class NotificationGroupActor(models.Model):
+    """Who has acted in a NotificationGroup and when they last did, so repeat actors are counted once"""
+    group = models.ForeignKey(
+        NotificationGroup,
+        on_delete=models.CASCADE,
+        related_name='actor_rows'
+    )
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    acted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'actor'], name='unique_group_actor'),
+        ]
+        indexes = [
+            models.Index(fields=['group', '-acted_at'], name='notif_group_actor_recent_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.actor_id} in {self.group_id}"
\ No newline at end of file
@@ -1,9 +1,11 @@
 from rest_framework import serializers
-from .models import Notification
-from accounts.serializers import UserProfileSerializer
+from .models import Notification, NotificationGroup
+from accounts.serializers import UserSummarySerializer
+from social_media_api.serializers import ExpandableFieldsMixin
+from .targets import serialize_target
 
-class NotificationSerializer(serializers.ModelSerializer):
-    actor_details = UserProfileSerializer(source='actor', read_only=True)
+class NotificationSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    actor_details = UserSummarySerializer(source='actor', read_only=True)
     target_object = serializers.SerializerMethodField()
     
     class Meta:
@@ -13,22 +15,45 @@ class NotificationSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'timestamp']
     
     def get_target_object(self, obj):
-        """Serialize the target object based on its type"""
-        if obj.target:
-            # You can customize this based on your target models
-            if hasattr(obj.target, 'title'):  # For posts
-                return {
-                    'type': 'post',
-                    'id': obj.target.id,
-                    'title': obj.target.title
-                }
-            elif hasattr(obj.target, 'content'):  # For comments
-                return {
-                    'type': 'comment',
-                    'id': obj.target.id,
-                    'content': obj.target.content[:50] + '...' if len(obj.target.content) > 50 else obj.target.content
-                }
-        return None
+        return serialize_target(obj.target)
+
+class NotificationGroupSerializer(serializers.ModelSerializer):
+    """Grouped notification, e.g. "alice and 41 others liked your post"."""
+    VERB_PHRASES = {
+        Notification.FOLLOW: 'started following you',
+        Notification.LIKE: 'liked your post',
+        Notification.COMMENT: 'commented on your post',
+        Notification.MENTION: 'mentioned you',
+    }
+    
+    recent_actors = serializers.SerializerMethodField()
+    target_object = serializers.SerializerMethodField()
+    summary = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = NotificationGroup
+        fields = ['id', 'verb', 'actor_count', 'recent_actors', 'summary',
+                 'read', 'target_object', 'timestamp']
+        read_only_fields = fields
+    
+    def _actors(self, obj):
+        # Attached for the whole page by services.attach_recent_actors
+        return getattr(obj, 'recent_actors', [])
+    
+    def get_recent_actors(self, obj):
+        return [{'id': actor.id, 'username': actor.username} for actor in self._actors(obj)]
+    
+    def get_target_object(self, obj):
+        return serialize_target(obj.target)
+    
+    def get_summary(self, obj):
+        actors = self._actors(obj)
+        name = actors[0].username if actors else 'Someone'
+        others = obj.actor_count - 1
+        phrase = self.VERB_PHRASES.get(obj.verb, obj.verb)
+        if others <= 0:
+            return f"{name} {phrase}"
+        return f"{name} and {others} other{'s' if others > 1 else ''} {phrase}"
 
 class NotificationUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,321 @@
+"""
+Notification dispatch.
+
+Views call notify() instead of creating Notification rows themselves.
+Events are queued once the surrounding transaction commits, duplicates in
+a batch are coalesced, and each batch is written with a single
+bulk_create. Every event also bumps its NotificationGroup row and
+records its actor in NotificationGroupActor, so with the default settings
+each event adds a notification row plus at most one actor row. Verbs in
+NOTIFICATIONS['GROUPED_ONLY_VERBS'] (none by default) are stored only as
+groups, which keeps a viral post to one row per distinct actor, but they
+then never reach the notification list or the unread count.
+The backend is chosen by NOTIFICATIONS['BACKEND']:
+
+    notifications.services.ThreadedBackend  background worker thread (default)
+    notifications.services.InlineBackend    writes in the request thread
+
+ThreadedBackend retries a batch that fails with an operational database
+error (lost connection, locked database) up to
+NOTIFICATIONS['RETRIES'] times, backing off exponentially from
+NOTIFICATIONS['RETRY_BACKOFF'] seconds, before logging it as lost.
+
+A broker-backed backend only needs to implement enqueue() and hand the
+events to write_events() on the consumer side.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import OperationalError, close_old_connections, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .counters import adjust_unread
+from .models import Notification, NotificationGroup, NotificationGroupActor
+from .streams import publish_events
+
+logger = logging.getLogger(__name__)
+
+NotificationEvent = namedtuple(
+    'NotificationEvent',
+    ['recipient_id', 'actor_id', 'verb', 'target_content_type_id', 'target_object_id']
+)
+
+DEFAULTS = {
+    'BACKEND': 'notifications.services.ThreadedBackend',
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'GROUP_WINDOW': 24 * 60 * 60,
+    'GROUPED_ONLY_VERBS': [],
+    'RETRIES': 3,
+    'RETRY_BACKOFF': 0.5,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_options():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATIONS', {})}
+
+
+def get_backend():
+    options = get_options()
+    path = options['BACKEND']
+    with _backends_lock:
+        if path not in _backends:
+            _backends[path] = import_string(path)(options)
+        return _backends[path]
+
+
+def build_event(recipient, actor, verb, target=None):
+    if target is not None:
+        content_type_id = ContentType.objects.get_for_model(target).id
+        object_id = target.pk
+    else:
+        content_type_id = object_id = None
+    return NotificationEvent(recipient.pk, actor.pk, verb, content_type_id, object_id)
+
+
+def notify(recipient, actor, verb, target=None):
+    """Queue a single notification; self-notifications are dropped"""
+    notify_many([(recipient, actor, verb, target)])
+
+
+def notify_many(items):
+    """Queue (recipient, actor, verb, target) tuples once the transaction commits"""
+    events = [build_event(*item) for item in items]
+    events = [event for event in events if event.recipient_id != event.actor_id]
+    if not events:
+        return
+    backend = get_backend()
+    transaction.on_commit(lambda: backend.enqueue(events))
+
+
+def coalesce(events):
+    """Drop repeated events (double taps, retries) while keeping order"""
+    return list(dict.fromkeys(events))
+
+
+def write_events(events, batch_size=500):
+    """Persist a batch of events: individual rows plus their group upserts"""
+    events = coalesce(events)
+    grouped_only = set(get_options()['GROUPED_ONLY_VERBS'])
+    notifications = [
+        Notification(
+            recipient_id=event.recipient_id,
+            actor_id=event.actor_id,
+            verb=event.verb,
+            target_content_type_id=event.target_content_type_id,
+            target_object_id=event.target_object_id,
+        )
+        for event in events if event.verb not in grouped_only
+    ]
+    with transaction.atomic():
+        created = Notification.objects.bulk_create(notifications, batch_size=batch_size)
+        upsert_groups(events)
+
+    unread = dict.fromkeys((event.recipient_id for event in events), 0)
+    for notification in notifications:
+        unread[notification.recipient_id] += 1
+    adjust_unread(unread)
+    publish_events(events)
+    return created
+
+
+def window_start(now, window):
+    seconds = int(now.timestamp()) // window * window
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+def upsert_groups(events, now=None):
+    """
+    Fold events into their NotificationGroup rows: missing groups are
+    inserted, actors are recorded or have acted_at moved forward, then
+    every touched group is refreshed with a single UPDATE. Everything
+    derived from the actor rows is computed in SQL, so concurrent writers
+    cannot overwrite each other's actors.
+    """
+    now = now or timezone.now()
+    start = window_start(now, get_options()['GROUP_WINDOW'])
+
+    batches = OrderedDict()
+    for event in events:
+        key = NotificationGroup.make_key(event.recipient_id, event.verb,
+                                         event.target_content_type_id,
+                                         event.target_object_id, start)
+        batches.setdefault(key, (event, []))[1].append(event.actor_id)
+    if not batches:
+        return []
+
+    NotificationGroup.objects.bulk_create([
+        NotificationGroup(
+            group_key=key,
+            recipient_id=event.recipient_id,
+            verb=event.verb,
+            target_content_type_id=event.target_content_type_id,
+            target_object_id=event.target_object_id,
+            window_start=start,
+            timestamp=now,
+        )
+        for key, (event, actors) in batches.items()
+    ], ignore_conflicts=True)
+
+    group_ids = dict(NotificationGroup.objects.filter(group_key__in=batches.keys())
+                     .values_list('group_key', 'pk'))
+    actor_rows = []
+    for key, (event, actors) in batches.items():
+        # Later events in the batch are more recent
+        order = {pk: index for index, pk in enumerate(actors)}
+        actor_rows.extend(
+            NotificationGroupActor(group_id=group_ids[key], actor_id=pk,
+                                   acted_at=now + timedelta(microseconds=index))
+            for pk, index in order.items()
+        )
+    NotificationGroupActor.objects.bulk_create(
+        actor_rows, update_conflicts=True,
+        unique_fields=['group', 'actor'], update_fields=['acted_at'],
+    )
+
+    # Counted from the actor rows, so repeat actors cannot inflate it
+    rows = NotificationGroupActor.objects.filter(group=OuterRef('pk'))
+    distinct_actors = rows.values('group').annotate(count=Count('*')).values('count')
+    latest_actor = rows.order_by('-acted_at', '-id').values('actor')[:1]
+    NotificationGroup.objects.filter(pk__in=group_ids.values()).update(
+        actor_count=Subquery(distinct_actors),
+        latest_actor=Subquery(latest_actor),
+        timestamp=now,
+        read=False,
+    )
+    return list(group_ids.values())
+
+
+def attach_recent_actors(groups):
+    """Set `recent_actors` on each group to its newest actors, loaded in one query"""
+    groups = {group.pk: group for group in groups}
+    for group in groups.values():
+        group.recent_actors = []
+    if not groups:
+        return
+    rows = (
+        NotificationGroupActor.objects.filter(group__in=list(groups))
+        .select_related('actor')
+        .annotate(rank=Window(RowNumber(), partition_by=F('group'),
+                              order_by=[F('acted_at').desc(), F('id').desc()]))
+        .filter(rank__lte=NotificationGroup.RECENT_ACTORS)
+        .order_by('group', 'rank')
+    )
+    for row in rows:
+        groups[row.group_id].recent_actors.append(row.actor)
+
+
+def mark_group_read(group):
+    """Mark a group and the notifications it summarizes as read; returns how many were unread"""
+    window = timedelta(seconds=get_options()['GROUP_WINDOW'])
+    with transaction.atomic():
+        NotificationGroup.objects.filter(pk=group.pk).update(read=True)
+        updated = Notification.objects.filter(
+            recipient_id=group.recipient_id,
+            verb=group.verb,
+            target_content_type_id=group.target_content_type_id,
+            target_object_id=group.target_object_id,
+            timestamp__gte=group.window_start,
+            timestamp__lt=group.window_start + window,
+            read=False,
+        ).update(read=True)
+    adjust_unread({group.recipient_id: -updated})
+    group.read = True
+    return updated
+
+
+class InlineBackend:
+    """Writes each batch immediately; useful for tests and single-process setups"""
+
+    def __init__(self, options):
+        self.batch_size = options['BATCH_SIZE']
+
+    def enqueue(self, events):
+        write_events(events, self.batch_size)
+
+    def flush(self):
+        pass
+
+    def pending(self):
+        return 0
+
+
+class ThreadedBackend:
+    """Buffers events in memory and writes them from a daemon worker thread"""
+
+    def __init__(self, options):
+        self.batch_size = options['BATCH_SIZE']
+        self.flush_interval = options['FLUSH_INTERVAL']
+        self.retries = options.get('RETRIES', DEFAULTS['RETRIES'])
+        self.retry_backoff = options.get('RETRY_BACKOFF', DEFAULTS['RETRY_BACKOFF'])
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def enqueue(self, events):
+        self._ensure_worker()
+        for event in events:
+            self.queue.put(event)
+
+    def flush(self):
+        """Block until every queued event has been written"""
+        if self._thread is not None:
+            self.queue.join()
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='notification-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception('Failed to write %d notification(s)', len(batch))
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write(self, batch):
+        """Write a batch, retrying transient database errors with exponential backoff"""
+        for attempt in range(self.retries):
+            try:
+                return write_events(batch, self.batch_size)
+            except OperationalError:
+                # write_events() rolled back, so the batch can be written again
+                logger.warning('Writing %d notification(s) failed, retrying', len(batch), exc_info=True)
+                close_old_connections()
+                time.sleep(self.retry_backoff * 2 ** attempt)
+        return write_events(batch, self.batch_size)
@@ -0,0 +1,153 @@
+"""
+Server-sent notification stream.
+
+Connected clients hold an open text/event-stream response and receive a
+message whenever a notification is written for them, so they no longer
+need to poll the unread endpoint. The stream view is async and is only
+available when served through social_media_api.asgi (GUNICORN_PROFILE=
+uvicorn). Under WSGI, Django drains an async response body into a list
+before sending it, so an endless stream would hold a worker until it is
+killed; WSGI requests are answered 501 instead.
+
+Messages go through a broker chosen by NOTIFICATIONS['STREAM_BROKER']. The
+default InProcessBroker only reaches clients connected to the same
+process; a shared broker (e.g. Redis pub/sub) needs to provide the same
+publish/subscribe/unsubscribe methods.
+"""
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+
+from accounts.authentication import CachedTokenAuthentication
+
+from .counters import get_unread_count
+
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 100
+
+
+class InProcessBroker:
+    """Fan messages out to asyncio queues of subscribers in this process"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id, message):
+        """Safe to call from any thread, including the notification writer"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, message)
+
+    def connections(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    @staticmethod
+    def _deliver(queue, message):
+        if queue.full():
+            # Slow client: drop the oldest message rather than block publishers
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            path = getattr(settings, 'NOTIFICATIONS', {}).get(
+                'STREAM_BROKER', 'notifications.streams.InProcessBroker')
+            _broker = import_string(path)()
+        return _broker
+
+
+def publish_events(events):
+    """Push freshly written notification events to connected recipients"""
+    broker = get_broker()
+    for event in events:
+        broker.publish(event.recipient_id, {
+            'event': 'notification',
+            'data': {
+                'verb': event.verb,
+                'actor': event.actor_id,
+                'target_content_type': event.target_content_type_id,
+                'target_object_id': event.target_object_id,
+            },
+        })
+
+
+def format_event(message):
+    return f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+
+
+def authenticate(request):
+    """Token from the Authorization header, or ?token= for EventSource clients"""
+    header = request.headers.get('Authorization', '')
+    key = header[6:].strip() if header.startswith('Token ') else request.GET.get('token')
+    if not key:
+        return None
+    try:
+        user, token = CachedTokenAuthentication().authenticate_credentials(key)
+    except AuthenticationFailed:
+        return None
+    return user
+
+
+async def notification_stream(request):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'detail': 'The notification stream requires the ASGI server (GUNICORN_PROFILE=uvicorn).'},
+            status=501
+        )
+    user = await sync_to_async(authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    async def events():
+        broker = get_broker()
+        subscriber = broker.subscribe(user.pk)
+        queue = subscriber[1]
+        try:
+            count = await sync_to_async(get_unread_count)(user.pk)
+            yield 'retry: 5000\n\n'
+            yield format_event({'event': 'unread', 'data': {'unread_count': count}})
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_event(message)
+        finally:
+            broker.unsubscribe(user.pk, subscriber)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
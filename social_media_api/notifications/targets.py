@@ -0,0 +1,70 @@
+"""
+Notification target registry.
+
+Each target model is registered by its app label with a function that
+renders it and a queryset limited to the columns that function reads.
+attach_targets() resolves the generic foreign key for a whole page of
+notifications with one query per target type, instead of one per row.
+"""
+from collections import defaultdict, namedtuple
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+
+TargetType = namedtuple('TargetType', ['name', 'serialize', 'fields'])
+
+_registry = {}
+
+
+def register(label, name, serialize, fields=None):
+    """Register a target model, e.g. register('posts.post', 'post', fn, ['title'])"""
+    _registry[label.lower()] = TargetType(name, serialize, fields)
+
+
+def serialize_target(target):
+    """Render a target through its registered type, or None if unknown"""
+    if target is None:
+        return None
+    target_type = _registry.get(target._meta.label_lower)
+    if target_type is None:
+        return None
+    return {'type': target_type.name, 'id': target.pk, **target_type.serialize(target)}
+
+
+def attach_targets(objects, field_name='target'):
+    """Prefetch the generic `target` of every object in one query per content type"""
+    objects = [obj for obj in objects if obj.target_content_type_id and obj.target_object_id]
+    if not objects:
+        return
+
+    wanted = defaultdict(set)
+    for obj in objects:
+        wanted[obj.target_content_type_id].add(obj.target_object_id)
+
+    resolved = {}
+    for content_type_id, ids in wanted.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            continue
+        queryset = model._default_manager.all()
+        target_type = _registry.get(model._meta.label_lower)
+        if target_type is not None and target_type.fields:
+            queryset = queryset.only(*target_type.fields)
+        for pk, target in queryset.in_bulk(ids).items():
+            resolved[(content_type_id, pk)] = target
+
+    field = objects[0]._meta.get_field(field_name)
+    for obj in objects:
+        key = (obj.target_content_type_id, obj.target_object_id)
+        field.set_cached_value(obj, resolved.get(key))
+
+
+def _truncate(text, length=50):
+    return text[:length] + '...' if len(text) > length else text
+
+
+if apps.is_installed('posts'):
+    register('posts.post', 'post', lambda post: {'title': post.title},
+             fields=['id', 'title'])
+    register('posts.comment', 'comment', lambda comment: {'content': _truncate(comment.content)},
+             fields=['id', 'content'])
@@ -1,12 +1,29 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+from unittest import mock
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
 
 User = get_user_model()
 
+# Counters and ETags are only cached when every worker shares the cache
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'social-media-api-test-cache'),
+    }
+}
+
+@override_settings(NOTIFICATIONS={'BACKEND': 'notifications.services.InlineBackend'})
 class NotificationTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.user1 = User.objects.create_user(
             username='user1',
             email='user1@example.com',
@@ -17,6 +34,7 @@ class NotificationTests(APITestCase):
             email='user2@example.com',
             password='testpass123'
         )
+        cache.clear()
         
         # Try to import Notification model
         try:
@@ -48,6 +66,33 @@ class NotificationTests(APITestCase):
         url = '/api/notifications/'
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotIn('count', response.data)
+    
+    def test_notifications_cursor_pagination(self):
+        if not hasattr(self, 'Notification'):
+            self.skipTest("Notifications not available")
+            
+        url = '/api/notifications/?page_size=1'
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['previous'])
+        first_id = response.data['results'][0]['id']
+        
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertNotEqual(response.data['results'][0]['id'], first_id)
+        self.assertIsNone(response.data['next'])
+        
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(response.data['results'][0]['id'], first_id)
+    
+    def test_notifications_page_number_mode(self):
+        if not hasattr(self, 'Notification'):
+            self.skipTest("Notifications not available")
+            
+        url = '/api/notifications/?paginate=page'
+        response = self.client.get(url)
         self.assertEqual(response.data['count'], 2)
     
     def test_get_unread_notifications(self):
@@ -60,6 +105,72 @@ class NotificationTests(APITestCase):
         self.assertEqual(response.data['unread_count'], 1)
         self.assertEqual(len(response.data['notifications']), 1)
     
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_unread_etag_short_circuits_idle_polls(self):
+        if not hasattr(self, 'Notification'):
+            self.skipTest("Notifications not available")
+            
+        cache.clear()
+        url = '/api/notifications/unread/'
+        response = self.client.get(url)
+        etag = response['ETag']
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 0)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.Notification.objects.create(recipient=self.user1, actor=self.user2, verb='follow')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unread_count'], 2)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{self.notification1.id}/mark_as_read/')
+        response = self.client.get(url)
+        self.assertEqual(response.data['unread_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark_all_as_read/')
+        response = self.client.get(url)
+        self.assertEqual(response.data['unread_count'], 0)
+    
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_rolled_back_notification_leaves_counter_alone(self):
+        if not hasattr(self, 'Notification'):
+            self.skipTest("Notifications not available")
+            
+        cache.clear()
+        url = '/api/notifications/unread/'
+        self.assertEqual(self.client.get(url).data['unread_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.Notification.objects.create(recipient=self.user1, actor=self.user2, verb='follow')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(self.client.get(url).data['unread_count'], 1)
+    
+    @override_settings(LOCAL_CACHE_TTL=5)
+    def test_local_counter_expires(self):
+        if not hasattr(self, 'Notification'):
+            self.skipTest("Notifications not available")
+            
+        url = '/api/notifications/unread/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        
+        # Written by another worker, so this process's counter is not adjusted
+        self.Notification.objects.bulk_create([
+            self.Notification(recipient=self.user1, actor=self.user2, verb='follow')])
+        self.assertEqual(self.client.get(url).data['unread_count'], 1)
+        with mock.patch('time.time', return_value=time.time() + 6):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unread_count'], 2)
+    
     def test_mark_notification_as_read(self):
         if not hasattr(self, 'Notification'):
             self.skipTest("Notifications not available")
@@ -82,4 +193,234 @@ class NotificationTests(APITestCase):
         
         # Check all notifications are read
         unread_count = self.Notification.objects.filter(recipient=self.user1, read=False).count()
-        self.assertEqual(unread_count, 0)
\ No newline at end of file
+        self.assertEqual(unread_count, 0)
+
+
+@override_settings(NOTIFICATIONS={'BACKEND': 'notifications.services.InlineBackend'})
+class NotificationServiceTests(APITestCase):
+    def setUp(self):
+        from posts.models import Post
+        from notifications.models import Notification
+        cache.clear()
+        self.Notification = Notification
+        self.user1 = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='testpass123'
+        )
+        self.user2 = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='testpass123'
+        )
+        self.post = Post.objects.create(author=self.user1, title='Post', content='Content')
+        self.client.force_authenticate(user=self.user2)
+    
+    def test_comment_notification_written_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{self.post.id}/add_comment/', {'content': 'Hi'})
+        notification = self.Notification.objects.get(recipient=self.user1)
+        self.assertEqual(notification.verb, 'comment')
+        self.assertEqual(notification.target, self.post)
+    
+    def recent_actor_ids(self, group):
+        from notifications.services import attach_recent_actors
+        attach_recent_actors([group])
+        return [actor.id for actor in group.recent_actors]
+    
+    def test_likes_are_grouped(self):
+        from notifications.models import NotificationGroup
+        fans = [User.objects.create_user(username=f'fan{i}', password='testpass123') for i in range(4)]
+        for fan in fans:
+            self.client.force_authenticate(user=fan)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/api/posts/{self.post.id}/like/')
+        
+        # Likes still show up individually and in the unread count
+        self.assertEqual(self.Notification.objects.filter(verb='like').count(), 4)
+        group = NotificationGroup.objects.get(recipient=self.user1, verb='like')
+        self.assertEqual(group.actor_count, 4)
+        self.assertEqual(self.recent_actor_ids(group), [fans[3].id, fans[2].id, fans[1].id])
+        
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get('/api/notifications/grouped/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.data['results'][0]
+        self.assertEqual(result['summary'], 'fan3 and 3 others liked your post')
+        self.assertEqual(result['target_object']['id'], self.post.id)
+        self.assertEqual(self.client.get('/api/notifications/unread/').data['unread_count'], 4)
+    
+    def test_group_counts_distinct_actors(self):
+        from notifications.models import NotificationGroup
+        from notifications.services import notify_many
+        fan = User.objects.create_user(username='fan', password='testpass123')
+        for actor in (fan, self.user2, fan, fan):
+            with self.captureOnCommitCallbacks(execute=True):
+                notify_many([(self.user1, actor, 'like', self.post)])
+        
+        group = NotificationGroup.objects.get(recipient=self.user1, verb='like')
+        self.assertEqual(group.actor_count, 2)
+        self.assertEqual(self.recent_actor_ids(group), [fan.id, self.user2.id])
+        self.assertEqual(group.latest_actor, fan)
+    
+    def test_group_actors_in_one_batch(self):
+        from notifications.models import NotificationGroup
+        from notifications.services import write_events, build_event
+        fans = [User.objects.create_user(username=f'fan{i}', password='testpass123') for i in range(2)]
+        write_events([build_event(self.user1, actor, 'like', self.post)
+                      for actor in (fans[0], self.user2, fans[1], fans[0])])
+        
+        group = NotificationGroup.objects.get(recipient=self.user1, verb='like')
+        # The repeated event is coalesced into the first one
+        self.assertEqual(group.actor_count, 3)
+        self.assertEqual(group.latest_actor, fans[1])
+        self.assertEqual(self.recent_actor_ids(group), [fans[1].id, self.user2.id, fans[0].id])
+    
+    def test_mark_group_as_read(self):
+        from notifications.models import NotificationGroup
+        from notifications.services import notify_many
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_many([(self.user1, self.user2, 'like', self.post),
+                         (self.user1, self.user2, 'follow', None)])
+        group = NotificationGroup.objects.get(recipient=self.user1, verb='like')
+        
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(f'/api/notifications/grouped/{group.id}/mark_as_read/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        group.refresh_from_db()
+        self.assertTrue(group.read)
+        self.assertEqual(list(self.Notification.objects.filter(read=False).values_list('verb', flat=True)),
+                         ['follow'])
+        self.assertEqual(self.client.get('/api/notifications/unread/').data['unread_count'], 1)
+        
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.post(f'/api/notifications/grouped/{group.id}/mark_as_read/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_duplicate_events_are_coalesced(self):
+        from notifications.services import notify_many
+        with self.captureOnCommitCallbacks(execute=True):
+            notify_many([(self.user1, self.user2, 'follow', None)] * 3 +
+                        [(self.user2, self.user2, 'follow', None)])
+        self.assertEqual(self.Notification.objects.count(), 1)
+    
+    def test_threaded_backend_batches_writes(self):
+        from notifications.services import ThreadedBackend, build_event
+        backend = ThreadedBackend({'BATCH_SIZE': 10, 'FLUSH_INTERVAL': 0.05})
+        events = [build_event(self.user1, self.user2, 'like', self.post)] * 4
+        with mock.patch('notifications.services.write_events') as write_events:
+            backend.enqueue(events)
+            backend.flush()
+        written = sum(len(call.args[0]) for call in write_events.call_args_list)
+        self.assertEqual(written, 4)
+        self.assertLessEqual(write_events.call_count, 4)
+    
+    def test_threaded_backend_retries_failed_batches(self):
+        from django.db import OperationalError
+        from notifications.services import ThreadedBackend, build_event
+        backend = ThreadedBackend({'BATCH_SIZE': 10, 'FLUSH_INTERVAL': 0.05,
+                                   'RETRIES': 3, 'RETRY_BACKOFF': 0})
+        events = [build_event(self.user1, self.user2, 'follow')]
+        with mock.patch('notifications.services.write_events',
+                        side_effect=[OperationalError('database is locked'), []]) as write_events, \
+                self.assertLogs('notifications.services', 'WARNING') as logs:
+            backend.enqueue(events)
+            backend.flush()
+        self.assertIn('retrying', logs.output[0])
+        self.assertEqual(write_events.call_count, 2)
+        self.assertEqual(write_events.call_args.args[0], events)
+    
+    def test_threaded_backend_retry_limits(self):
+        from django.db import IntegrityError, OperationalError
+        from notifications.services import ThreadedBackend, build_event
+        backend = ThreadedBackend({'BATCH_SIZE': 10, 'FLUSH_INTERVAL': 0.05,
+                                   'RETRIES': 2, 'RETRY_BACKOFF': 0})
+        events = [build_event(self.user1, self.user2, 'follow')]
+        
+        # Transient errors are retried RETRIES times, then the batch is given up
+        with mock.patch('notifications.services.write_events',
+                        side_effect=OperationalError('database is locked')) as write_events, \
+                self.assertLogs('notifications.services', 'ERROR') as logs:
+            backend.enqueue(events)
+            backend.flush()
+        self.assertEqual(write_events.call_count, 3)
+        self.assertIn('Failed to write 1 notification(s)', logs.output[-1])
+        
+        # A constraint violation fails the same way every time
+        with mock.patch('notifications.services.write_events',
+                        side_effect=IntegrityError('FOREIGN KEY constraint failed')) as write_events:
+            with self.assertRaises(IntegrityError):
+                backend._write(events)
+        self.assertEqual(write_events.call_count, 1)
+    
+    def test_list_resolves_targets_in_batches(self):
+        from posts.models import Comment
+        
+        def make_notifications(count):
+            for i in range(count):
+                comment = Comment.objects.create(post=self.post, author=self.user2, content='x' * 60)
+                self.Notification.objects.create(recipient=self.user1, actor=self.user2,
+                                                 verb='comment', target=self.post)
+                self.Notification.objects.create(recipient=self.user1, actor=self.user2,
+                                                 verb='mention', target=comment)
+        
+        self.client.force_authenticate(user=self.user1)
+        make_notifications(1)
+        self.client.get('/api/notifications/')  # load the viewer's follow graph
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/notifications/')
+        make_notifications(5)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/notifications/')
+        
+        self.assertEqual(len(small), len(large))
+        targets = {item['target_object']['type'] for item in response.data['results']}
+        self.assertEqual(targets, {'post', 'comment'})
+        comment = next(item for item in response.data['results'] if item['verb'] == 'mention')
+        self.assertTrue(comment['target_object']['content'].endswith('...'))
+
+
+class NotificationStreamTests(APITestCase):
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+    
+    def test_stream_requires_token(self):
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+        
+        response = async_to_sync(AsyncClient().get)('/api/notifications/stream/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_stream_is_refused_under_wsgi(self):
+        response = self.client.get(f'/api/notifications/stream/?token={self.token.key}')
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+    
+    def test_stream_pushes_published_events(self):
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+        from notifications.services import build_event
+        from notifications.streams import get_broker, publish_events
+        
+        async def read_stream():
+            response = await AsyncClient().get(f'/api/notifications/stream/?token={self.token.key}')
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            chunks = response.streaming_content
+            self.assertEqual(await anext(chunks), b'retry: 5000\n\n')
+            self.assertIn(b'"unread_count": 0', await anext(chunks))
+            
+            publish_events([build_event(self.user, self.user, 'follow')])
+            message = await asyncio.wait_for(anext(chunks), 1)
+            await chunks.aclose()
+            return message
+        
+        message = async_to_sync(read_stream)()
+        self.assertTrue(message.startswith(b'event: notification'))
+        self.assertEqual(get_broker().connections(), 0)
@@ -1,10 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import NotificationViewSet
+from .streams import notification_stream
+from social_media_api.async_views import as_async_view
 
 router = DefaultRouter()
 router.register(r'notifications', NotificationViewSet, basename='notification')
 
 urlpatterns = [
+    # Server-sent events; listed before the router so "stream" is not taken as a pk
+    path('notifications/stream/', notification_stream, name='notification-stream'),
+    # Polled constantly, so served async like the stream
+    path('notifications/unread/', as_async_view(NotificationViewSet.as_view({'get': 'unread'})),
+         name='notification-unread'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
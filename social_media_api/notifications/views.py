@@ -3,8 +3,13 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.viewsets import GenericViewSet
 from django.db.models import Q
-from .models import Notification
-from .serializers import NotificationSerializer, NotificationUpdateSerializer
+from .models import Notification, NotificationGroup
+from .serializers import (NotificationSerializer, NotificationUpdateSerializer,
+                          NotificationGroupSerializer)
+from .counters import get_unread_count, reset_unread, unread_etag
+from .services import attach_recent_actors, mark_group_read
+from .targets import attach_targets
+from social_media_api.pagination import TimestampKeysetPagination
 
 class NotificationViewSet(GenericViewSet):
     """
@@ -12,9 +17,19 @@ class NotificationViewSet(GenericViewSet):
     """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = NotificationSerializer
+    pagination_class = TimestampKeysetPagination
+    replica_actions = ('list', 'unread', 'grouped')
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return (Notification.objects.filter(recipient=self.request.user)
+                .select_related('actor'))
+    
+    def get_serializer(self, *args, **kwargs):
+        # Resolve generic targets for the whole page before serializing
+        if args:
+            instances = args[0] if kwargs.get('many') else [args[0]]
+            attach_targets(instances)
+        return super().get_serializer(*args, **kwargs)
     
     def list(self, request):
         """Get all notifications for the current user"""
@@ -40,16 +55,44 @@ class NotificationViewSet(GenericViewSet):
     @action(detail=False, methods=['get'])
     def unread(self, request):
         """Get unread notifications count and list"""
+        # Idle polls revalidate against the cached counter without touching the database
+        etag = unread_etag(request.user.pk)
+        headers = {'Cache-Control': 'private, no-cache'}
+        if etag is not None:
+            headers['ETag'] = etag
+            if request.headers.get('If-None-Match') == etag:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
         unread_notifications = self.get_queryset().filter(read=False)
-        unread_count = unread_notifications.count()
+        unread_count = get_unread_count(request.user.pk)
         
         # Get recent unread notifications
-        recent_unread = unread_notifications[:10]  # Last 10 unread
+        recent_unread = list(unread_notifications[:10])  # Last 10 unread
         
         serializer = self.get_serializer(recent_unread, many=True)
         return Response({
             'unread_count': unread_count,
             'notifications': serializer.data
+        }, headers=headers)
+    
+    @action(detail=False, methods=['get'])
+    def grouped(self, request):
+        """Aggregated notifications, newest activity first"""
+        groups = NotificationGroup.objects.filter(recipient=request.user)
+        page = self.paginate_queryset(groups)
+        attach_targets(page)
+        attach_recent_actors(page)
+        serializer = NotificationGroupSerializer(page, many=True,
+                                                 context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['post'], url_path=r'grouped/(?P<group_id>[0-9]+)/mark_as_read')
+    def mark_group_as_read(self, request, group_id=None):
+        """Mark one grouped notification, and the notifications it covers, as read"""
+        group = generics.get_object_or_404(NotificationGroup, pk=group_id, recipient=request.user)
+        updated_count = mark_group_read(group)
+        return Response({
+            'message': f'Marked {updated_count} notifications as read.'
         })
     
     @action(detail=True, methods=['post'])
@@ -63,6 +106,8 @@ class NotificationViewSet(GenericViewSet):
     def mark_all_as_read(self, request):
         """Mark all notifications as read"""
         updated_count = self.get_queryset().filter(read=False).update(read=True)
+        NotificationGroup.objects.filter(recipient=request.user, read=False).update(read=True)
+        reset_unread(request.user.pk)
         return Response({
             'message': f'Marked {updated_count} notifications as read.'
         })
@@ -74,17 +119,3 @@ class NotificationViewSet(GenericViewSet):
             notification.mark_as_read()
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
-    
-    @property
-    def paginator(self):
-        if not hasattr(self, '_paginator'):
-            from rest_framework.pagination import PageNumberPagination
-            self._paginator = PageNumberPagination()
-            self._paginator.page_size = 20
-        return self._paginator
-
-    def paginate_queryset(self, queryset):
-        return self.paginator.paginate_queryset(queryset, self.request, view=self)
-
-    def get_paginated_response(self, data):
-        return self.paginator.get_paginated_response(data)
\ No newline at end of file
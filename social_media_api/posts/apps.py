@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from .search_index import restore_search_index
+        post_migrate.connect(restore_search_index, sender=self,
+                             dispatch_uid='posts_restore_search_index')
@@ -0,0 +1,142 @@
+"""
+Materialized home timelines.
+
+New posts are fanned out on write into a FeedEntry row per follower, so a
+feed page is a range scan over (owner, created_at). Authors with more than
+FEED_FANOUT_THRESHOLD followers are skipped on write, which keeps a single
+post from writing millions of rows; their posts are marked
+fanned_out=False and pulled in on read instead. The mark stays with the
+post, so it still reaches timelines after its author drops below the
+threshold.
+
+FeedPagination pages over a Timeline: the next FeedEntry rows in
+(-created_at, -post) order and the next pulled posts from followed
+authors, each an indexed range scan, merged by time.
+"""
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from social_media_api.pagination import CreatedAtKeysetPagination
+
+from .models import Post, FeedEntry
+
+BATCH_SIZE = 1000
+
+
+def fanout_threshold():
+    return getattr(settings, 'FEED_FANOUT_THRESHOLD', 10000)
+
+
+def max_entries():
+    return getattr(settings, 'FEED_MAX_ENTRIES', 1000)
+
+
+def is_pull_author(author):
+    """Authors above the threshold are merged into feeds at read time"""
+    return author.followers_count >= fanout_threshold()
+
+
+def fan_out_post(post):
+    """Push a newly created post into every follower's timeline"""
+    author = post.author
+    if is_pull_author(author):
+        Post.objects.filter(pk=post.pk).update(fanned_out=False)
+        post.fanned_out = False
+        return 0
+
+    follower_ids = list(author.followers.values_list('id', flat=True))
+    for start in range(0, len(follower_ids), BATCH_SIZE):
+        owner_ids = follower_ids[start:start + BATCH_SIZE]
+        FeedEntry.objects.bulk_create([
+            FeedEntry(owner_id=owner_id, post=post, author=author, created_at=post.created_at)
+            for owner_id in owner_ids
+        ], ignore_conflicts=True)
+        trim_feeds(owner_ids)
+    return len(follower_ids)
+
+
+def backfill_feed(owner, author):
+    """Copy an author's recent posts into a new follower's timeline"""
+    return backfill_authors(owner, [author.pk])
+
+
+def backfill_authors(owner, author_ids):
+    """Copy the recent posts of several newly followed authors in one pass"""
+    # Posts that were not fanned out are pulled in on read
+    posts = (Post.objects.filter(author_id__in=author_ids, fanned_out=True)
+             .order_by('-created_at', '-id')[:max_entries()])
+    entries = [
+        FeedEntry(owner=owner, post_id=post_id, author_id=author_id, created_at=created_at)
+        for post_id, author_id, created_at in posts.values_list('id', 'author_id', 'created_at')
+    ]
+    FeedEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    trim_feed(owner)
+    return len(entries)
+
+
+def remove_author(owner, author):
+    """Drop an unfollowed author's posts from a timeline"""
+    return remove_authors(owner, [author.pk])
+
+
+def remove_authors(owner, author_ids):
+    return FeedEntry.objects.filter(owner=owner, author_id__in=author_ids).delete()[0]
+
+
+def trim_feed(owner):
+    """Keep only the newest FEED_MAX_ENTRIES rows of a timeline"""
+    return trim_feeds([owner.pk])
+
+
+def trim_feeds(owner_ids):
+    """Keep only the newest FEED_MAX_ENTRIES rows of each of several timelines"""
+    stale = list(
+        FeedEntry.objects.filter(owner_id__in=owner_ids)
+        .annotate(rank=Window(RowNumber(), partition_by=F('owner'),
+                              order_by=[F('created_at').desc(), F('post').desc()]))
+        .filter(rank__gt=max_entries())
+        .values_list('pk', flat=True)
+    )
+    if not stale:
+        return 0
+    return FeedEntry.objects.filter(pk__in=stale).delete()[0]
+
+
+class Timeline:
+    """A user's home timeline; `posts` is the queryset page posts are loaded from"""
+
+    def __init__(self, user, posts=None):
+        self.user = user
+        self.posts = posts if posts is not None else Post.objects.all()
+
+    def sources(self):
+        """(queryset, post id field) pairs whose rows carry created_at"""
+        Follow = type(self.user).followers.through
+        # A row (from_customuser=A, to_customuser=B) means B follows A.
+        following = Follow.objects.filter(to_customuser=self.user.pk).values('from_customuser')
+        return [
+            (FeedEntry.objects.filter(owner=self.user), 'post'),
+            (Post.objects.filter(fanned_out=False, author__in=following), 'id'),
+        ]
+
+
+class FeedPagination(CreatedAtKeysetPagination):
+    """Keyset pages over a Timeline; there is no page-number mode"""
+
+    def use_page_numbers(self, queryset, request):
+        return False
+
+    def fetch(self, timeline, position, order, limit):
+        descending = order[0].startswith('-')
+        keys = set()
+        for queryset, key in timeline.sources():
+            source_order = (order[0], f'-{key}' if descending else key)
+            queryset = queryset.order_by(*source_order)
+            if position is not None:
+                queryset = queryset.filter(self._after(position, source_order))
+            keys.update(queryset.values_list('created_at', key)[:limit])
+        keys = sorted(keys, reverse=descending)[:limit]
+
+        posts = timeline.posts.in_bulk([pk for _, pk in keys])
+        return [posts[pk] for _, pk in keys if pk in posts]
@@ -0,0 +1,198 @@
+"""
+Like and unlike in one round trip each.
+
+like_post() inserts the like with
+
+    INSERT INTO posts_like (...) SELECT ... FROM posts_post WHERE id = %s
+    ON CONFLICT (post_id, user_id) DO NOTHING RETURNING id
+
+so a missing post, a repeat tap and a concurrent double tap all come
+back as "no row" instead of an IntegrityError on unique_like.
+unlike_post() is a single DELETE ... RETURNING. Only a statement that
+actually changed a row updates likes_count and trending_score, in the
+same transaction and with one UPDATE ... RETURNING author_id. Repeating
+a request is therefore harmless.
+
+Databases without RETURNING support fall back to a plain create inside a
+savepoint.
+
+like_status() answers "which of these posts has the viewer liked" for a
+whole screen of posts. The set of post ids a user has liked is cached
+under a versioned key in the LIKED_POSTS_CACHE cache, and every like or
+unlike bumps the version; with a process-local cache other workers see
+it after LOCAL_CACHE_TTL seconds (see social_media_api.caching). Users
+with more than LIKED_POSTS_MAX_CACHED likes are not cached; their
+lookups use the unique_like (post, user) index instead.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models.sql import UpdateQuery
+from django.utils import timezone
+
+from social_media_api.caching import bump_version, get_version, versioned_cache
+from social_media_api.querysets import adjusted
+
+from . import trending
+from .models import Like, Post
+
+LikeResult = namedtuple('LikeResult', ['like', 'changed', 'author_id'])
+
+VERSION_KEY = 'liked-posts:version:{}'
+SET_KEY = 'liked-posts:{}:{}'
+TIMEOUT = 60 * 60
+
+
+def _supports_returning(connection):
+    return connection.features.can_return_columns_from_insert
+
+
+def _update_post(using, post_id, kind, delta, at):
+    """Adjust likes_count and the trending score; returns the author id or None"""
+    values = {'likes_count': adjusted('likes_count', delta)}
+    values['trending_score'] = (
+        trending.record_expression(kind, at) if delta > 0 else trending.retract_expression(kind, at)
+    )
+    connection = connections[using]
+    if not _supports_returning(connection):
+        Post.objects.using(using).filter(pk=post_id).update(**values)
+        return Post.objects.using(using).filter(pk=post_id).values_list('author_id', flat=True).first()
+
+    query = Post.objects.using(using).filter(pk=post_id).query.chain(UpdateQuery)
+    query.add_update_values(values)
+    sql, params = query.get_compiler(using).as_sql()
+    author = connection.ops.quote_name(Post._meta.get_field('author').column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING {author}', params)
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def like_post(user, post_id, attempts=3):
+    """
+    Like a post at most once.
+
+    Returns LikeResult(like, changed, author_id). `like` is None when the
+    post does not exist; `changed` is False when it was already liked.
+    """
+    using = router.db_for_write(Like)
+    for _ in range(attempts):
+        result = _insert_like(user, post_id, using)
+        if result.like is not None:
+            return result
+        # Nothing inserted and no like found: either the post is gone, or
+        # a concurrent unlike removed the like in between; try again.
+        if not Post.objects.using(using).filter(pk=post_id).exists():
+            break
+    return LikeResult(None, False, None)
+
+
+def _insert_like(user, post_id, using):
+    connection = connections[using]
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        if _supports_returning(connection):
+            table = connection.ops.quote_name(Like._meta.db_table)
+            posts = connection.ops.quote_name(Post._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} (post_id, user_id, created_at) '
+                    f'SELECT id, %s, %s FROM {posts} WHERE id = %s '
+                    f'ON CONFLICT (post_id, user_id) DO NOTHING RETURNING id',
+                    [user.pk, connection.ops.adapt_datetimefield_value(now), post_id],
+                )
+                row = cursor.fetchone()
+            like = Like(id=row[0], post_id=post_id, user=user, created_at=now) if row else None
+        else:
+            like = None
+            if Post.objects.using(using).filter(pk=post_id).exists():
+                try:
+                    with transaction.atomic(using=using):
+                        like = Like.objects.using(using).create(post_id=post_id, user=user)
+                except IntegrityError:
+                    pass
+
+        if like is not None:
+            author_id = _update_post(using, post_id, 'like', 1, like.created_at)
+            transaction.on_commit(lambda: invalidate_liked(user.pk), using=using)
+            return LikeResult(like, True, author_id)
+
+    # Nothing inserted: either the post is gone or the like already exists
+    like = Like.objects.using(using).filter(post_id=post_id, user=user).first()
+    if like is not None:
+        like.user = user
+    return LikeResult(like, False, None)
+
+
+def unlike_post(user, post_id):
+    """Remove the viewer's like if there is one; returns True when one was removed"""
+    using = router.db_for_write(Like)
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if _supports_returning(connection):
+            table = connection.ops.quote_name(Like._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE post_id = %s AND user_id = %s RETURNING created_at',
+                    [post_id, user.pk],
+                )
+                row = cursor.fetchone()
+            created_at = None
+            if row is not None:
+                field = Like._meta.get_field('created_at')
+                created_at = row[0]
+                for converter in connection.ops.get_db_converters(field.get_col(Like._meta.db_table)):
+                    created_at = converter(created_at, field, connection)
+        else:
+            like = Like.objects.using(using).filter(post_id=post_id, user=user).first()
+            created_at = like.created_at if like is not None else None
+            if like is not None:
+                like.delete()
+
+        if created_at is None:
+            return False
+        _update_post(using, post_id, 'like', -1, created_at)
+        transaction.on_commit(lambda: invalidate_liked(user.pk), using=using)
+        return True
+
+
+def _cache():
+    return versioned_cache(getattr(settings, 'LIKED_POSTS_CACHE', 'default'))
+
+
+def liked_post_ids(user):
+    """Ids of every post `user` has liked as a frozenset, or None if not cached"""
+    cache = _cache()
+    if cache is None:
+        return None
+    key = SET_KEY.format(user.pk, get_version(cache, VERSION_KEY.format(user.pk)))
+    ids = cache.get(key)
+    if ids is None:
+        limit = getattr(settings, 'LIKED_POSTS_MAX_CACHED', 5000)
+        ids = list(Like.objects.filter(user=user.pk).values_list('post_id', flat=True)[:limit + 1])
+        # Cache the overflow marker too, so heavy likers skip this scan
+        ids = frozenset(ids) if len(ids) <= limit else False
+        cache.set(key, ids, TIMEOUT)
+    return ids if ids is not False else None
+
+
+def invalidate_liked(user_id):
+    cache = _cache()
+    if cache is not None:
+        bump_version(cache, VERSION_KEY.format(user_id))
+
+
+def like_status(user, post_ids):
+    """
+    {post id: (liked, likes_count)} for the existing posts among `post_ids`.
+
+    One query for the counters, plus one indexed Like lookup when the
+    user's liked set is not cached.
+    """
+    counts = dict(Post.objects.filter(pk__in=post_ids).values_list('id', 'likes_count'))
+    liked = liked_post_ids(user)
+    if liked is None:
+        liked = set(Like.objects.filter(user=user.pk, post_id__in=list(counts))
+                    .values_list('post_id', flat=True))
+    return {post_id: (post_id in liked, count) for post_id, count in counts.items()}
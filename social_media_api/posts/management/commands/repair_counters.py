@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from accounts import graph
+from accounts.authentication import invalidate_user
+from posts.models import Post, Comment, Like
+
+
+def count_by(model, column):
+    """Correlated COUNT(*) of model rows pointing at the outer row"""
+    return Coalesce(Subquery(
+        model.objects.filter(**{column: OuterRef('pk')})
+        .order_by().values(column).annotate(total=Count('id')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recomputes denormalized like, comment, reply and follow counters that have drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows scanned per UPDATE (default: 5000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted rows without fixing them')
+
+    def handle(self, *args, **options):
+        Follow = get_user_model().followers.through
+
+        posts = self.repair(Post.objects.all(), {
+            'likes_count': count_by(Like, 'post'),
+            'comments_count': count_by(Comment, 'post'),
+        }, **options)
+        comments = self.repair(Comment.objects.all(), {
+            'replies_count': count_by(Comment, 'parent'),
+        }, **options)
+        users = self.repair(get_user_model().objects.all(), {
+            'followers_count': count_by(Follow, 'from_customuser'),
+            'following_count': count_by(Follow, 'to_customuser'),
+        }, on_repair=self.invalidate_users, **options)
+
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {posts} post(s), {comments} comment(s) and {users} user(s) with drifted counters'
+        ))
+
+    def invalidate_users(self, ids):
+        """update() skips the save signals, so drop the users' cached tokens and follow sets"""
+        User = get_user_model()
+        for user_id in ids:
+            invalidate_user(user_id)
+            graph.invalidate(User(pk=user_id))
+
+    def repair(self, queryset, counters, batch_size, dry_run, on_repair=None, **options):
+        """Walk the table in primary key ranges and rewrite rows whose counters disagree"""
+        actual = {f'actual_{field}': expression for field, expression in counters.items()}
+        drifted = Q()
+        for field in counters:
+            drifted |= ~Q(**{field: F(f'actual_{field}')})
+
+        repaired = 0
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')
+                         .values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return repaired
+            last_pk = batch[-1]
+
+            ids = list(queryset.filter(pk__in=batch).annotate(**actual)
+                       .filter(drifted).values_list('pk', flat=True))
+            if ids and not dry_run:
+                with transaction.atomic():
+                    queryset.filter(pk__in=ids).update(**counters)
+                    if on_repair is not None:
+                        on_repair(ids)
+            repaired += len(ids)
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:02
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from posts.search_index import create_search_index
+    create_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from posts.search_index import drop_search_index
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:29
+
+import math
+
+from django.db import migrations, models
+
+# SQLite rebuilds posts_post to add the column, which drops the search
+# index triggers; posts.search_index restores them after migrate.
+
+
+def fill_trending_scores(apps, schema_editor):
+    # Existing likes and comments are counted as if they happened when
+    # the post was created.
+    from posts.trending import event_score
+
+    Post = apps.get_model('posts', 'Post')
+    batch = []
+    for post in Post.objects.only('id', 'created_at', 'likes_count', 'comments_count').iterator():
+        post.trending_score = event_score('post', post.created_at)
+        for kind, count in (('like', post.likes_count), ('comment', post.comments_count)):
+            if count:
+                x = event_score(kind, post.created_at, count)
+                high, low = max(post.trending_score, x), min(post.trending_score, x)
+                post.trending_score = high + math.log1p(math.exp(low - high))
+        batch.append(post)
+        if len(batch) >= 1000:
+            Post.objects.bulk_update(batch, ['trending_score'])
+            batch = []
+    Post.objects.bulk_update(batch, ['trending_score'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-trending_score', '-id'], name='post_trending_idx'),
+        ),
+        migrations.RunPython(fill_trending_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pulled_posts(apps, schema_editor):
+    # Posts of authors currently above the threshold were never fanned out
+    threshold = getattr(settings, 'FEED_FANOUT_THRESHOLD', 10000)
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(author__followers_count__gte=threshold).update(fanned_out=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_counters'),
+        ('posts', '0007_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['author', '-created_at', '-id'], name='post_pulled_idx'),
+        ),
+        migrations.RunPython(mark_pulled_posts, migrations.RunPython.noop),
+    ]
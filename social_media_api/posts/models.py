@@ -1,6 +1,50 @@
 from django.db import models
 from django.conf import settings
+from django.db.models import Exists, OuterRef, Prefetch, Value
 from django.utils import timezone
+from social_media_api.querysets import CounterQuerySet
+from . import threads, trending
+
+class PostQuerySet(CounterQuerySet):
+    def with_details(self, viewer=None, summary=False, expand=(), fields=()):
+        """
+        Prefetch and annotate everything PostSerializer reads, so a page of
+        posts costs a fixed number of queries regardless of its size.
+        
+        In summary mode only the first few comments are loaded, and likes
+        are skipped, unless the client asked to expand them. With a sparse
+        fieldset (`fields`), nothing is loaded for fields left out of it.
+        """
+        def wanted(name):
+            return not fields or name in fields or name in expand
+        
+        queryset = self.select_related('author')
+        if wanted('is_liked'):
+            if viewer is not None and viewer.is_authenticated:
+                viewer_has_liked = Exists(Like.objects.filter(post=OuterRef('pk'), user=viewer.pk))
+            else:
+                viewer_has_liked = Value(False)
+            queryset = queryset.annotate(viewer_has_liked=viewer_has_liked)
+        
+        # Replies are loaded per thread (posts.threads), not embedded in posts
+        comments = Comment.objects.filter(parent__isnull=True).select_related('author')
+        prefetches = []
+        if not summary or 'comments' in expand:
+            if wanted('comments'):
+                prefetches.append(Prefetch('comments', queryset=comments))
+        elif wanted('recent_comments'):
+            preview_size = getattr(settings, 'POST_COMMENT_PREVIEW_SIZE', 3)
+            prefetches.append(Prefetch(
+                'comments',
+                queryset=comments.order_by('created_at', 'id')[:preview_size],
+                to_attr='recent_comments'
+            ))
+        if (not summary or 'likes' in expand) and wanted('likes'):
+            prefetches.append(Prefetch('likes', queryset=Like.objects.select_related('user')))
+        
+        # Follow state of every rendered user comes from the viewer's cached
+        # follow graph (accounts.graph), so no per-user queries are needed.
+        return queryset.prefetch_related(*prefetches)
 
 class Post(models.Model):
     author = models.ForeignKey(
@@ -12,16 +56,30 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    # Log-domain time-decayed engagement score, see posts.trending
+    trending_score = models.FloatField(default=0, editable=False)
+    # False for posts of pull authors, merged into timelines on read (posts.feed)
+    fanned_out = models.BooleanField(default=True, editable=False)
+    
+    objects = PostQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-trending_score', '-id'], name='post_trending_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_pulled_idx',
+                         condition=models.Q(fanned_out=False)),
+        ]
     
     def __str__(self):
         return f"{self.title} by {self.author.username}"
     
-    @property
-    def likes_count(self):
-        return self.likes.count()
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.trending_score:
+            self.trending_score = trending.event_score('post')
+        super().save(*args, **kwargs)
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -34,15 +92,51 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name='comments'
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='replies'
+    )
+    # Materialized path of base-36 ancestor ids, see posts.threads
+    path = models.CharField(max_length=255, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    replies_count = models.PositiveIntegerField(default=0, editable=False)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = CounterQuerySet.as_manager()
+    
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ]
     
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        parent = self.parent if adding and self.parent_id else None
+        if parent is not None and parent.depth + 1 > threads.max_depth():
+            # Too deep: reply to the deepest allowed ancestor instead
+            parent = parent.parent
+            self.parent = parent
+        if parent is not None:
+            self.depth = parent.depth + 1
+        super().save(*args, **kwargs)
+        if adding and not self.path:
+            # The path ends with the comment's own id, known only after the insert
+            self.path = (parent.path if parent else '') + threads.path_segment(self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+    
+    def subtree(self):
+        """This comment and all its replies, in thread order"""
+        return Comment.objects.filter(threads.subtree_filter(self.path),
+                                      post_id=self.post_id).order_by('path')
 
 class Like(models.Model):
     post = models.ForeignKey(
@@ -64,4 +158,36 @@ class Like(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.user.username} likes {self.post.title}"
\ No newline at end of file
+        return f"{self.user.username} likes {self.post.title}"
+
+class FeedEntry(models.Model):
+    """A post materialized into a follower's home timeline"""
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='feed_owner_recent_idx'),
+            models.Index(fields=['owner', 'author'], name='feed_owner_author_idx'),
+        ]
+        ordering = ['-created_at', '-post']
+    
+    def __str__(self):
+        return f"{self.post_id} in {self.owner_id}'s feed"
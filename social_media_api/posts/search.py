@@ -0,0 +1,192 @@
+"""
+Post search.
+
+PostSearchFilter replaces DRF's SearchFilter (a LIKE '%term%' scan of
+every post) with the full-text index defined in posts.search_index:
+
+    SQLite      posts_post_search, an FTS5 table kept in sync by triggers
+    PostgreSQL  a GIN expression index over a weighted tsvector of title
+                and content, maintained by the database itself
+
+Every term of ?search= is matched as a prefix and all terms must match.
+Results are ranked, with title matches weighing more than content, unless
+the client asks for an explicit ?ordering=. highlight_posts() adds marked
+up title and content excerpts to a page of results. Other databases fall
+back to the substring filters SearchFilter used.
+
+Like accounts_user_search, the SQLite triggers are dropped whenever a
+migration rebuilds posts_post; a post_migrate handler in
+posts.search_index puts them back.
+"""
+import html
+
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+from accounts.search import search_terms
+
+from .search_index import SEARCH_TABLE
+
+SEARCH_CONFIG = 'english'
+# Must match the expression indexed in posts.search_index exactly
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce({table}.title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({table}.content, '')), 'B')"
+)
+TITLE_WEIGHT, CONTENT_WEIGHT = 4.0, 1.0
+SNIPPET_TOKENS = 24
+
+# Private use characters mark matches, so highlights can be escaped safely
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+_index_available = {}
+
+
+def search_backend(using):
+    """'fts5', 'tsvector' or None when the database has no post index"""
+    if using not in _index_available:
+        connection = connections[using]
+        backend = None
+        if connection.vendor == 'sqlite':
+            if SEARCH_TABLE in connection.introspection.table_names():
+                backend = 'fts5'
+        elif connection.vendor == 'postgresql':
+            backend = 'tsvector'
+        _index_available[using] = backend
+    return _index_available[using]
+
+
+def match_expression(terms):
+    return ' '.join('"{}"*'.format(term) for term in terms)
+
+
+def tsquery_expression(terms):
+    return ' & '.join('{}:*'.format(term) for term in terms)
+
+
+def search_posts(queryset, query):
+    """
+    Narrow a post queryset to those matching every term of `query`.
+
+    With an index, each post is annotated with `search_rank`; higher
+    ranks are better matches.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    backend = search_backend(queryset.db)
+    table = queryset.model._meta.db_table
+    if backend == 'fts5':
+        match = match_expression(terms)
+        # bm25() is lower for better matches
+        rank = RawSQL(
+            f'(SELECT -bm25({SEARCH_TABLE}, %s, %s) FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = "{table}"."id")',
+            [TITLE_WEIGHT, CONTENT_WEIGHT, match], output_field=FloatField(),
+        )
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match]
+        )).annotate(search_rank=rank)
+
+    if backend == 'tsvector':
+        vector = SEARCH_VECTOR.format(table=f'"{table}"')
+        tsquery = tsquery_expression(terms)
+        return queryset.annotate(search_rank=RawSQL(
+            f'ts_rank({vector}, to_tsquery(%s, %s))', [SEARCH_CONFIG, tsquery],
+            output_field=FloatField(),
+        )).filter(id__in=RawSQL(
+            f'SELECT id FROM "{table}" WHERE {vector} @@ to_tsquery(%s, %s)',
+            [SEARCH_CONFIG, tsquery],
+        ))
+
+    for term in terms:
+        queryset = queryset.filter(Q(title__icontains=term) | Q(content__icontains=term))
+    return queryset
+
+
+def render_highlight(text):
+    """Escape indexed text and turn the match markers into <mark> tags"""
+    if text is None:
+        return None
+    return html.escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def highlight_posts(posts, query, using='default'):
+    """
+    Set `search_highlight` ({'title': ..., 'content': ...}) on each post.
+
+    Runs one query for the whole page, so excerpts are only built for
+    the posts actually rendered.
+    """
+    posts = list(posts)
+    terms = search_terms(query)
+    backend = search_backend(using)
+    if not posts or not terms or backend is None:
+        return posts
+
+    ids = [post.pk for post in posts]
+    placeholders = ', '.join(['%s'] * len(ids))
+    if backend == 'fts5':
+        sql = (
+            f'SELECT rowid, highlight({SEARCH_TABLE}, 0, %s, %s), '
+            f"snippet({SEARCH_TABLE}, 1, %s, %s, '…', %s) "
+            f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND rowid IN ({placeholders})'
+        )
+        params = [MARK_START, MARK_END, MARK_START, MARK_END, SNIPPET_TOKENS,
+                  match_expression(terms), *ids]
+    else:
+        table = posts[0]._meta.db_table
+        options = (f'StartSel={MARK_START}, StopSel={MARK_END}, '
+                   f'MaxWords={SNIPPET_TOKENS}, MinWords={SNIPPET_TOKENS // 2}')
+        sql = (
+            f'SELECT id, ts_headline(%s, title, q, %s), ts_headline(%s, content, q, %s) '
+            f'FROM "{table}", to_tsquery(%s, %s) q WHERE id IN ({placeholders})'
+        )
+        params = [SEARCH_CONFIG, options + ', HighlightAll=true', SEARCH_CONFIG, options,
+                  SEARCH_CONFIG, tsquery_expression(terms), *ids]
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        highlights = {
+            pk: {'title': render_highlight(title), 'content': render_highlight(content)}
+            for pk, title, content in cursor.fetchall()
+        }
+    for post in posts:
+        post.search_highlight = highlights.get(post.pk)
+    return posts
+
+
+class PostSearchFilter(BaseFilterBackend):
+    """
+    Full-text ?search= over post titles and content.
+
+    List it after OrderingFilter: results are ordered by rank unless the
+    request carries an explicit ordering.
+    """
+    search_param = 'search'
+    ordering_param = 'ordering'
+
+    def get_search_query(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if not search_terms(query):
+            return queryset
+        queryset = search_posts(queryset, query)
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get(
+                getattr(view, 'ordering_param', self.ordering_param)):
+            queryset = queryset.order_by('-search_rank', '-id')
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search over title and content; terms match as prefixes.',
+            'schema': {'type': 'string'},
+        }]
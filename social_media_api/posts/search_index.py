@@ -0,0 +1,41 @@
+"""
+Full-text index for post search.
+
+    SQLite      posts_post_search, an external-content FTS5 table over
+                title and content (see social_media_api.fts)
+    PostgreSQL  a GIN index over the same weighted tsvector posts.search
+                queries
+
+Migration 0005 creates it. Other databases fall back to substring
+filters in posts.search.
+"""
+from social_media_api.fts import SearchIndex
+
+POSTGRES_CREATE_SQL = [
+    """
+    CREATE INDEX IF NOT EXISTS posts_post_search_idx ON posts_post USING GIN ((
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ))
+    """,
+]
+
+POSTGRES_DROP_SQL = [
+    'DROP INDEX IF EXISTS posts_post_search_idx',
+]
+
+index = SearchIndex(
+    table='posts_post_search',
+    content_table='posts_post',
+    columns=('title', 'content'),
+    migration=('posts', '0005_post_search_index'),
+    vendor_sql={'postgresql': (POSTGRES_CREATE_SQL, POSTGRES_DROP_SQL)},
+)
+
+SEARCH_TABLE = index.table
+TRIGGERS = index.triggers
+
+create_search_index = index.create
+drop_search_index = index.drop
+missing_triggers = index.missing_triggers
+restore_search_index = index.restore
@@ -1,9 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Post, Comment, Like
-from accounts.serializers import UserProfileSerializer
+from accounts.serializers import UserSummarySerializer
+from social_media_api.serializers import ExpandableFieldsMixin
 
 class LikeSerializer(serializers.ModelSerializer):
-    user_details = UserProfileSerializer(source='user', read_only=True)
+    user_details = UserSummarySerializer(source='user', read_only=True)
     
     class Meta:
         model = Like
@@ -11,18 +13,39 @@ class LikeSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'created_at']
 
 class CommentSerializer(serializers.ModelSerializer):
-    author_details = UserProfileSerializer(source='author', read_only=True)
+    author_details = UserSummarySerializer(source='author', read_only=True)
     
     class Meta:
         model = Comment
-        fields = ['id', 'post', 'author', 'author_details', 'content', 
-                 'created_at', 'updated_at']
-        read_only_fields = ['id', 'author', 'created_at', 'updated_at']
+        fields = ['id', 'post', 'parent', 'depth', 'author', 'author_details', 'content',
+                 'replies_count', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'author', 'depth', 'replies_count', 'created_at', 'updated_at']
+    
+    def validate(self, attrs):
+        if self.instance is not None:
+            # A comment's place in its thread is fixed once written
+            attrs.pop('parent', None)
+            return attrs
+        parent = attrs.get('parent')
+        if parent is not None and parent.post_id != attrs['post'].pk:
+            raise serializers.ValidationError({'parent': 'Replies must belong to the same post.'})
+        return attrs
     
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
         return super().create(validated_data)
 
+class ThreadCommentSerializer(CommentSerializer):
+    """A comment with the replies loaded by posts.threads.build_threads"""
+    replies = serializers.SerializerMethodField()
+    
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ['replies']
+    
+    def get_replies(self, obj):
+        replies = getattr(obj, 'thread_replies', [])
+        return ThreadCommentSerializer(replies, many=True, context=self.context).data
+
 class CommentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
@@ -33,33 +56,64 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         validated_data['post'] = self.context['post']
         return super().create(validated_data)
 
-class PostSerializer(serializers.ModelSerializer):
-    author_details = UserProfileSerializer(source='author', read_only=True)
+class PostSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    author_details = UserSummarySerializer(source='author', read_only=True)
     comments = CommentSerializer(many=True, read_only=True)
-    comments_count = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
+    recent_comments = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
     likes = LikeSerializer(many=True, read_only=True)
+    search_highlight = serializers.SerializerMethodField()
     
     class Meta:
         model = Post
         fields = ['id', 'author', 'author_details', 'title', 'content',
-                 'created_at', 'updated_at', 'comments', 'comments_count',
-                 'likes_count', 'is_liked', 'likes']
-        read_only_fields = ['id', 'author', 'created_at', 'updated_at']
+                 'created_at', 'updated_at', 'comments', 'recent_comments',
+                 'comments_count', 'likes_count', 'is_liked', 'likes',
+                 'search_highlight']
+        read_only_fields = ['id', 'author', 'created_at', 'updated_at',
+                           'comments_count', 'likes_count']
+        # Left out of list and feed responses unless requested with ?expand=
+        expandable_fields = ['comments', 'likes']
     
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+    def get_fields(self):
+        fields = super().get_fields()
+        # Only search results carry highlights
+        if not self.context.get('search'):
+            fields.pop('search_highlight', None)
+        # The preview stands in for the full comments, so only summaries get it
+        if not self.context.get('summary') or 'comments' in fields:
+            fields.pop('recent_comments', None)
+        return fields
     
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+    def get_search_highlight(self, obj):
+        return getattr(obj, 'search_highlight', None)
+    
+    def get_recent_comments(self, obj):
+        """The first few comments, from the summary prefetch when available"""
+        if hasattr(obj, 'recent_comments'):
+            comments = obj.recent_comments
+        else:
+            comments = obj.comments.filter(parent__isnull=True)[
+                :getattr(settings, 'POST_COMMENT_PREVIEW_SIZE', 3)]
+        return CommentSerializer(comments, many=True, context=self.context).data
     
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'viewer_has_liked'):
+                return obj.viewer_has_liked
             return obj.likes.filter(user=request.user).exists()
         return False
 
+class LikeStatusSerializer(serializers.Serializer):
+    MAX_POSTS = 300
+
+    post_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_POSTS
+    )
+
 class PostCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
@@ -1,11 +1,44 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+import threading
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.utils.functional import SimpleLazyObject
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Post, Comment, Like
+from rest_framework.authtoken.models import Token
+from social_media_api import async_views, replicas
+from datetime import timedelta
+from django.utils import timezone
+from .models import Post, Comment, Like, FeedEntry
+from . import trending
+from .likes import like_post
 
 User = get_user_model()
 
+# Versioned caches are only used when every worker shares the cache
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'social-media-api-test-cache'),
+    }
+}
+
+# Notifications are written in the test's own thread and transaction
+INLINE_NOTIFICATIONS = {'BACKEND': 'notifications.services.InlineBackend'}
+
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
 class LikeTests(APITestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(
@@ -43,9 +76,11 @@ class LikeTests(APITestCase):
         except Exception:
             self.skipTest("Database table for likes might not be created yet")
         
+        # Repeated likes are idempotent
         url = f'/api/posts/{self.post.id}/like/'
         response = self.client.post(url)
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Like.objects.filter(post=self.post, user=self.user1).count(), 1)
     
     def test_unlike_post(self):
         # First create a like directly if the table exists
@@ -59,6 +94,30 @@ class LikeTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertFalse(Like.objects.filter(post=self.post, user=self.user1).exists())
     
+    def test_like_and_unlike_round_trips(self):
+        with self.assertNumQueries(4):
+            # Savepoint, INSERT ... RETURNING, UPDATE ... RETURNING, release
+            result = like_post(self.user1, self.post.id)
+        self.assertTrue(result.changed)
+        self.assertEqual(result.author_id, self.user2.id)
+        
+        url = f'/api/posts/{self.post.id}/'
+        response = self.client.post(url + 'like/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], result.like.id)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        
+        self.assertEqual(self.client.post(url + 'unlike/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(url + 'unlike/').status_code, status.HTTP_200_OK)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        
+        self.assertEqual(self.client.post('/api/posts/999999/like/').status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.post('/api/posts/999999/unlike/').status_code,
+                         status.HTTP_404_NOT_FOUND)
+    
     def test_get_post_likes(self):
         # Create a like directly if the table exists
         try:
@@ -69,4 +128,603 @@ class LikeTests(APITestCase):
         url = f'/api/posts/{self.post.id}/likes/'
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
\ No newline at end of file
+        self.assertEqual(len(response.data), 1)
+
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class LikeStatusTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.posts = [
+            Post.objects.create(author=self.other, title=f'Post {i}', content='...')
+            for i in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+    
+    def status_of(self, post_ids):
+        response = self.client.post('/api/likes/status/', {'post_ids': post_ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_status_reflects_likes_and_unlikes(self):
+        first, second, third = self.posts
+        like_post(self.user, first.id)
+        like_post(self.other, first.id)
+        like_post(self.other, second.id)
+        
+        data = self.status_of([third.id, first.id, 999999, second.id, first.id])
+        self.assertEqual(data['posts'], [
+            {'id': third.id, 'liked': False, 'likes_count': 0},
+            {'id': first.id, 'liked': True, 'likes_count': 2},
+            {'id': second.id, 'liked': False, 'likes_count': 1},
+        ])
+        self.assertEqual(data['missing'], [999999])
+        
+        # The cached liked set is replaced once the viewer's next like commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{second.id}/like/')
+            self.client.post(f'/api/posts/{first.id}/unlike/')
+        liked = {post['id']: post['liked'] for post in self.status_of([first.id, second.id])['posts']}
+        self.assertEqual(liked, {first.id: False, second.id: True})
+    
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_cached_lookup_costs_one_query(self):
+        cache.clear()
+        ids = [post.id for post in self.posts]
+        self.status_of(ids)
+        with self.assertNumQueries(1):
+            self.status_of(ids)
+        
+        with override_settings(LIKED_POSTS_MAX_CACHED=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                like_post(self.user, ids[0])
+            self.assertTrue(self.status_of(ids)['posts'][0]['liked'])
+    
+    @override_settings(LOCAL_CACHE_TTL=5)
+    def test_process_local_cache_expires(self):
+        cache.clear()
+        ids = [post.id for post in self.posts]
+        self.status_of(ids)
+        with self.assertNumQueries(1):
+            self.status_of(ids)
+        
+        # Liked in another worker: this process's set is only replaced once it expires
+        Like.objects.create(post=self.posts[1], user=self.user)
+        self.assertFalse(self.status_of(ids)['posts'][1]['liked'])
+        with mock.patch('time.time', return_value=time.time() + 6), self.assertNumQueries(2):
+            liked = [post['liked'] for post in self.status_of(ids)['posts']]
+        self.assertEqual(liked, [False, True, False])
+    
+    def test_rejects_oversized_requests(self):
+        response = self.client.post(
+            '/api/likes/status/', {'post_ids': list(range(1, 302))}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class FeedFanOutTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.follower = User.objects.create_user(
+            username='follower',
+            email='follower@example.com',
+            password='testpass123'
+        )
+        self.follower.follow(self.author)
+    
+    def test_new_post_is_fanned_out_to_followers(self):
+        self.client.force_authenticate(user=self.author)
+        response = self.client.post('/api/posts/', {'title': 'Fresh', 'content': 'Hot off the press'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(FeedEntry.objects.filter(owner=self.follower, post__title='Fresh').exists())
+        
+        self.client.force_authenticate(user=self.follower)
+        response = self.client.get('/api/feed/')
+        self.assertEqual(response.data['results'][0]['title'], 'Fresh')
+    
+    def test_unfollow_removes_author_from_feed(self):
+        Post.objects.create(author=self.author, title='Old', content='Old content')
+        self.follower.unfollow(self.author)
+        self.follower.follow(self.author)
+        self.assertEqual(FeedEntry.objects.filter(owner=self.follower).count(), 1)
+        
+        self.follower.unfollow(self.author)
+        self.assertFalse(FeedEntry.objects.filter(owner=self.follower).exists())
+    
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_popular_authors_are_merged_on_read(self):
+        self.client.force_authenticate(user=self.author)
+        self.client.post('/api/posts/', {'title': 'Celebrity', 'content': 'Pulled on read'})
+        self.assertFalse(FeedEntry.objects.exists())
+        
+        self.client.force_authenticate(user=self.follower)
+        response = self.client.get('/api/feed/')
+        self.assertEqual(response.data['results'][0]['title'], 'Celebrity')
+    
+    @override_settings(FEED_MAX_ENTRIES=2)
+    def test_fan_out_trims_timelines(self):
+        self.client.force_authenticate(user=self.author)
+        for i in range(3):
+            self.client.post('/api/posts/', {'title': f'Post {i}', 'content': '...'})
+        titles = FeedEntry.objects.filter(owner=self.follower).values_list('post__title', flat=True)
+        self.assertEqual(list(titles), ['Post 2', 'Post 1'])
+    
+    def test_pages_merge_entries_and_pulled_posts(self):
+        celebrity = User.objects.create_user(username='celebrity', password='testpass123')
+        self.follower.follow(celebrity)
+        for i in range(4):
+            for author in (self.author, celebrity):
+                with override_settings(FEED_FANOUT_THRESHOLD=1 if author == celebrity else 10000):
+                    self.client.force_authenticate(user=author)
+                    self.client.post('/api/posts/', {'title': f'{author.username} {i}', 'content': '...'})
+        
+        # The celebrity dropped below the threshold; their pulled posts stay in the feed
+        self.assertEqual(Post.objects.filter(author=celebrity, fanned_out=False).count(), 4)
+        self.client.force_authenticate(user=self.follower)
+        titles, url = [], '/api/feed/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            titles += [post['title'] for post in response.data['results']]
+            url = response.data['next']
+        expected = [f'{name} {i}' for i in reversed(range(4)) for name in ('celebrity', 'author')]
+        self.assertEqual(titles, expected)
+
+
+@override_settings(CACHES=SHARED_CACHES, NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class QueryBudgetTests(APITestCase):
+    # feed entries + pulled posts + posts with their authors + comment
+    # previews with their authors; the viewer's follow graph comes from the cache
+    FEED_PAGE_QUERIES = 4
+    
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user(
+            username='viewer',
+            email='viewer@example.com',
+            password='testpass123'
+        )
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.fans = [
+            User.objects.create_user(username=f'fan{i}', password='testpass123')
+            for i in range(3)
+        ]
+        self.viewer.follow(self.author)
+        self.client.force_authenticate(user=self.viewer)
+    
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(author=self.author, title=f'Post {i}', content='Content',
+                                       likes_count=len(self.fans), comments_count=len(self.fans))
+            FeedEntry.objects.create(owner=self.viewer, post=post, author=self.author,
+                                     created_at=post.created_at)
+            for fan in self.fans:
+                Comment.objects.create(post=post, author=fan, content='Nice')
+                Like.objects.create(post=post, user=fan)
+    
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+    
+    def test_feed_page_has_fixed_query_budget(self):
+        self.add_posts(2)
+        self.client.get('/api/feed/')  # warm the viewer's follow graph
+        small, _ = self.count_queries('/api/feed/')
+        self.add_posts(6)
+        large, response = self.count_queries('/api/feed/')
+        
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, self.FEED_PAGE_QUERIES)
+        first = response.data['results'][0]
+        self.assertEqual(first['likes_count'], 3)
+        self.assertEqual(first['author_details']['followers_count'], 1)
+        self.assertTrue(first['author_details']['is_following'])
+    
+    def test_post_list_has_fixed_query_budget(self):
+        self.add_posts(2)
+        self.client.get('/api/posts/')
+        small, _ = self.count_queries('/api/posts/')
+        self.add_posts(6)
+        large, _ = self.count_queries('/api/posts/')
+        self.assertEqual(small, large)
+    
+    def test_list_summary_and_expand(self):
+        self.add_posts(1)
+        response = self.client.get('/api/posts/')
+        post = response.data['results'][0]
+        self.assertNotIn('likes', post)
+        self.assertNotIn('comments', post)
+        self.assertEqual(len(post['recent_comments']), settings.POST_COMMENT_PREVIEW_SIZE)
+        self.assertTrue(post['is_liked'] is False)
+        
+        response = self.client.get('/api/posts/?expand=likes,comments')
+        post = response.data['results'][0]
+        self.assertEqual(len(post['likes']), 3)
+        self.assertEqual(len(post['comments']), 3)
+        
+        self.assertNotIn('recent_comments', post)
+        
+        response = self.client.get('/api/posts/?fields=id,title')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        
+        response = self.client.get(f"/api/posts/{post['id']}/")
+        self.assertIn('likes', response.data)
+        self.assertEqual(len(response.data['comments']), 3)
+        self.assertNotIn('recent_comments', response.data)
+    
+    def test_sparse_fieldset_skips_prefetches(self):
+        self.add_posts(2)
+        self.client.get('/api/posts/')
+        full, _ = self.count_queries('/api/posts/')
+        sparse, response = self.count_queries('/api/posts/?fields=id,title')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # No comment preview prefetch
+        self.assertEqual(sparse, full - 1)
+
+
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class CounterTests(APITestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='testpass123'
+        )
+        self.user2 = User.objects.create_user(
+            username='user2',
+            email='user2@example.com',
+            password='testpass123'
+        )
+        self.post = Post.objects.create(
+            author=self.user2,
+            title='Test Post',
+            content='Test content'
+        )
+        self.client.force_authenticate(user=self.user1)
+    
+    def test_like_and_comment_counters(self):
+        self.client.post(f'/api/posts/{self.post.id}/like/')
+        self.client.post(f'/api/posts/{self.post.id}/add_comment/', {'content': 'Hi'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.comments_count, 1)
+        
+        self.client.post(f'/api/posts/{self.post.id}/unlike/')
+        comment = self.post.comments.get()
+        self.client.delete(f'/api/comments/{comment.id}/')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        self.assertEqual(self.post.comments_count, 0)
+    
+    def test_follow_counters(self):
+        self.user1.follow(self.user2)
+        self.user1.refresh_from_db()
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user1.following_count, 1)
+        self.assertEqual(self.user2.followers_count, 1)
+        
+        self.user1.unfollow(self.user2)
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user2.followers_count, 0)
+    
+    def test_repair_counters_command(self):
+        Like.objects.create(post=self.post, user=self.user1)
+        self.user2.followers.add(self.user1)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        
+        call_command('repair_counters', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.user2.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertEqual(self.user2.followers_count, 1)
+    
+    def test_repair_counters_invalidates_users(self):
+        User.objects.filter(pk=self.user2.pk).update(followers_count=5)
+        with mock.patch('posts.management.commands.repair_counters.invalidate_user') as invalidate, \
+                mock.patch('accounts.graph.invalidate') as invalidate_graph:
+            call_command('repair_counters', stdout=StringIO())
+        invalidate.assert_called_once_with(self.user2.pk)
+        self.assertEqual(invalidate_graph.call_args[0][0].pk, self.user2.pk)
+
+
+class PostSearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@example.com',
+            password='testpass123'
+        )
+        self.title_match = Post.objects.create(
+            author=self.user, title='Django performance tips', content='Indexes first'
+        )
+        self.content_match = Post.objects.create(
+            author=self.user, title='Weekend notes', content='Reading about django <b>caching</b>'
+        )
+        Post.objects.create(author=self.user, title='Gardening', content='Tomatoes again')
+        self.client.force_authenticate(user=self.user)
+    
+    def search(self, query, **params):
+        response = self.client.get('/api/posts/', {'search': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+    
+    def test_prefix_terms_and_ranking(self):
+        results = self.search('djan')
+        self.assertEqual([post['id'] for post in results],
+                         [self.title_match.id, self.content_match.id])
+        self.assertEqual([post['id'] for post in self.search('djan cach')],
+                         [self.content_match.id])
+        self.assertEqual(self.search('nothing'), [])
+        
+        # An explicit ordering wins over relevance
+        results = self.search('django', ordering='-created_at')
+        self.assertEqual(results[0]['id'], self.content_match.id)
+    
+    def test_highlights_are_escaped(self):
+        results = self.search('caching')
+        highlight = results[0]['search_highlight']
+        self.assertIn('&lt;b&gt;<mark>caching</mark>&lt;/b&gt;', highlight['content'])
+        self.assertEqual(highlight['title'], 'Weekend notes')
+        
+        response = self.client.get('/api/posts/')
+        self.assertNotIn('search_highlight', response.data['results'][0])
+    
+    def test_index_follows_updates_and_deletes(self):
+        self.title_match.title = 'Flask notes'
+        self.title_match.save()
+        self.assertEqual([post['id'] for post in self.search('flask')], [self.title_match.id])
+        self.assertEqual([post['id'] for post in self.search('django')], [self.content_match.id])
+        
+        self.content_match.delete()
+        self.assertEqual(self.search('django'), [])
+
+
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class CommentThreadTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user1', password='testpass123')
+        self.post = Post.objects.create(author=self.user, title='Thread', content='...')
+        self.client.force_authenticate(user=self.user)
+    
+    def reply(self, parent=None, content='...'):
+        data = {'post': self.post.id, 'content': content}
+        if parent is not None:
+            data['parent'] = parent
+        response = self.client.post('/api/comments/', data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+    
+    def test_paths_and_counters(self):
+        root = self.reply()
+        child = self.reply(root)
+        grandchild = self.reply(child)
+        other_root = self.reply()
+        
+        comments = Comment.objects.in_bulk()
+        self.assertEqual(comments[grandchild].depth, 2)
+        self.assertTrue(comments[grandchild].path.startswith(comments[child].path))
+        self.assertEqual([c.id for c in comments[root].subtree()], [root, child, grandchild])
+        self.assertEqual(comments[root].replies_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 4)
+        
+        # Deleting a comment removes its replies and their counts
+        self.client.delete(f'/api/comments/{child}/')
+        self.assertFalse(Comment.objects.filter(pk=grandchild).exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertEqual(Comment.objects.get(pk=root).replies_count, 0)
+        self.assertTrue(Comment.objects.filter(pk=other_root).exists())
+    
+    @override_settings(COMMENT_MAX_DEPTH=1)
+    def test_replies_past_max_depth_attach_to_ancestor(self):
+        root = self.reply()
+        child = self.reply(root)
+        too_deep = Comment.objects.get(pk=self.reply(child))
+        self.assertEqual((too_deep.parent_id, too_deep.depth), (root, 1))
+    
+    def test_reply_must_belong_to_same_post(self):
+        other = Post.objects.create(author=self.user, title='Other', content='...')
+        comment = Comment.objects.create(post=other, author=self.user, content='...')
+        response = self.client.post('/api/comments/', {
+            'post': self.post.id, 'parent': comment.id, 'content': '...'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(f'/api/posts/{self.post.id}/add_comment/', {
+            'parent': comment.id, 'content': '...'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_thread_loads_each_level_in_pages(self):
+        roots = [self.reply(content=f'root {i}') for i in range(2)]
+        replies = [self.reply(roots[0], content=f'reply {i}') for i in range(4)]
+        nested = self.reply(replies[0], content='nested')
+        self.reply(nested, content='too deep for levels=2')
+        
+        # The post, one page of top-level comments, one query for their replies
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                f'/api/posts/{self.post.id}/thread/', {'levels': 2, 'replies': 3})
+        first = response.data['results'][0]
+        self.assertEqual(first['id'], roots[0])
+        self.assertEqual(first['replies_count'], 4)
+        self.assertEqual([r['id'] for r in first['replies']], replies[:3])
+        self.assertEqual([r['id'] for r in first['replies'][0]['replies']], [nested])
+        self.assertEqual(first['replies'][0]['replies'][0]['replies'], [])
+        self.assertEqual(response.data['results'][1]['replies'], [])
+        
+        # The rest of a level pages through ?parent=
+        response = self.client.get('/api/comments/', {'parent': roots[0], 'page_size': 3})
+        self.assertEqual([c['id'] for c in response.data['results']], replies[:3])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([c['id'] for c in response.data['results']], replies[3:])
+        
+        response = self.client.get(f'/api/comments/{replies[0]}/thread/', {'levels': 5})
+        self.assertEqual(response.data['replies'][0]['replies'][0]['content'],
+                         'too deep for levels=2')
+        
+        # Post responses embed top-level comments only
+        response = self.client.get(f'/api/posts/{self.post.id}/')
+        self.assertEqual([c['id'] for c in response.data['comments']], roots)
+
+
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class TrendingTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.fans = [
+            User.objects.create_user(username=f'fan{i}', password='testpass123')
+            for i in range(3)
+        ]
+        self.quiet = Post.objects.create(author=self.author, title='Quiet', content='...')
+        self.popular = Post.objects.create(author=self.author, title='Popular', content='...')
+    
+    def trending_ids(self, **params):
+        self.client.force_authenticate(user=self.author)
+        response = self.client.get('/api/posts/trending/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['id'] for post in response.data]
+    
+    def test_engagement_raises_rank(self):
+        # Newest first before any engagement
+        self.assertEqual(self.trending_ids(), [self.popular.id, self.quiet.id])
+        
+        for fan in self.fans:
+            self.client.force_authenticate(user=fan)
+            self.client.post(f'/api/posts/{self.quiet.id}/like/')
+        self.client.post(f'/api/posts/{self.quiet.id}/add_comment/', {'content': 'Nice'})
+        self.assertEqual(self.trending_ids(), [self.quiet.id, self.popular.id])
+        self.assertEqual(self.trending_ids(limit=1), [self.quiet.id])
+    
+    def test_unlike_takes_back_its_contribution(self):
+        before = Post.objects.get(pk=self.quiet.pk).trending_score
+        self.client.force_authenticate(user=self.fans[0])
+        self.client.post(f'/api/posts/{self.quiet.id}/like/')
+        self.assertGreater(Post.objects.get(pk=self.quiet.pk).trending_score, before)
+        
+        self.client.post(f'/api/posts/{self.quiet.id}/unlike/')
+        self.assertAlmostEqual(Post.objects.get(pk=self.quiet.pk).trending_score, before, places=6)
+    
+    def test_deleting_a_thread_takes_back_every_comment(self):
+        before = Post.objects.get(pk=self.quiet.pk).trending_score
+        self.client.force_authenticate(user=self.fans[0])
+        response = self.client.post(f'/api/posts/{self.quiet.id}/add_comment/', {'content': 'Top'})
+        parent = response.data['id']
+        for fan in self.fans[1:]:
+            self.client.force_authenticate(user=fan)
+            self.client.post(f'/api/posts/{self.quiet.id}/add_comment/', {'content': 'Re', 'parent': parent})
+        
+        self.client.force_authenticate(user=self.fans[0])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(f'/api/comments/{parent}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(len([q for q in queries if 'trending_score' in q['sql']]), 1)
+        self.assertAlmostEqual(Post.objects.get(pk=self.quiet.pk).trending_score, before, places=6)
+    
+    def test_recent_events_outweigh_older_ones(self):
+        now = timezone.now()
+        trending.record(self.quiet.pk, 'like', now - timedelta(days=2))
+        trending.record(self.quiet.pk, 'like', now - timedelta(days=2))
+        trending.record(self.popular.pk, 'like', now)
+        self.assertEqual(self.trending_ids(), [self.popular.id, self.quiet.id])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], CACHES=SHARED_CACHES, NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        replicas._health.clear()
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.post = Post.objects.create(author=self.user, title='Post', content='Content')
+        self.client.force_authenticate(user=self.user)
+    
+    def request_for(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+    
+    def test_only_opted_in_reads_are_routed(self):
+        with mock.patch.object(replicas, 'healthy_replicas', return_value=['default']), \
+                mock.patch.object(replicas, 'read_alias', wraps=replicas.read_alias) as read_alias:
+            self.client.get('/api/posts/')
+            self.assertTrue(read_alias.called)
+            read_alias.reset_mock()
+            
+            self.client.post(f'/api/posts/{self.post.id}/like/')
+            self.client.get(f'/api/posts/{self.post.id}/likes/')
+            self.assertFalse(read_alias.called)
+    
+    def test_writes_pin_user_to_primary(self):
+        with mock.patch.object(replicas, 'healthy_replicas', return_value=['replica1']):
+            self.assertEqual(replicas.read_alias(self.request_for(self.user)), 'replica1')
+            
+            with mock.patch.object(replicas, 'healthy_replicas', return_value=['default']):
+                response = self.client.post(f'/api/posts/{self.post.id}/like/')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertTrue(replicas.is_pinned(self.user.pk))
+            self.assertEqual(replicas.read_alias(self.request_for(self.user)), 'default')
+            
+            cache.clear()
+            self.assertEqual(replicas.read_alias(self.request_for(self.user)), 'replica1')
+    
+    def test_authentication_reads_use_primary(self):
+        request = RequestFactory().get('/')
+        with mock.patch.object(replicas, 'healthy_replicas', return_value=['replica1']):
+            self.assertEqual(replicas.read_alias(request), 'default')
+            request.user = SimpleLazyObject(lambda: self.user)
+            self.assertEqual(replicas.read_alias(request), 'default')
+            request.user = AnonymousUser()
+            self.assertEqual(replicas.read_alias(request), 'replica1')
+    
+    def test_replicas_require_shared_pin_cache(self):
+        replicas.ReplicaMiddleware(lambda request: None)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                replicas.ReplicaMiddleware(lambda request: None)
+            with override_settings(DATABASE_REPLICAS=[]):
+                replicas.ReplicaMiddleware(lambda request: None)
+    
+    def test_lagging_or_missing_replica_falls_back_to_primary(self):
+        # replica1 is not configured here, so the health check fails
+        self.assertEqual(replicas.healthy_replicas(), [])
+        replicas._health.clear()
+        with mock.patch.object(replicas, 'replica_lag', return_value=30):
+            self.assertEqual(replicas.healthy_replicas(), [])
+        replicas._health.clear()
+        with mock.patch.object(replicas, 'replica_lag', return_value=0):
+            self.assertEqual(replicas.healthy_replicas(), ['replica1'])
+
+
+@override_settings(NOTIFICATIONS=INLINE_NOTIFICATIONS)
+class AsyncViewTests(TransactionTestCase):
+    def test_feed_and_unread_run_on_the_view_pool(self):
+        user = User.objects.create_user(username='reader', password='testpass123')
+        headers = {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+        threads, original = [], async_views._run
+        
+        def run(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return original(*args, **kwargs)
+        
+        client = AsyncClient()
+        with mock.patch.object(async_views, '_run', side_effect=run):
+            feed = async_to_sync(client.get)('/api/feed/', headers=headers)
+            unread = async_to_sync(client.get)('/api/notifications/unread/', headers=headers)
+        self.assertEqual(feed.status_code, status.HTTP_200_OK)
+        self.assertEqual(feed.json()['results'], [])
+        self.assertEqual(unread.json()['unread_count'], 0)
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(name.startswith('async-view') for name in threads))
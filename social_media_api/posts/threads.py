@@ -0,0 +1,87 @@
+"""
+Comment threads.
+
+Every comment stores a materialized path: the fixed-width base-36 ids of
+its ancestors followed by its own, e.g. for a reply to a reply
+
+    000000b 000000q 0000013   ->   "000000b000000q0000013"
+
+so ordering by path lists a thread depth first, replies in the order
+they were written, and a whole subtree is one range scan of the
+(post, path) index:
+
+    path >= "000000b"  AND  path < "000000c"
+
+Replies deeper than COMMENT_MAX_DEPTH are attached to the deepest
+allowed ancestor instead. build_threads() loads the replies of a page of
+comments with a single query, keeping at most `per_level` replies per
+comment on each level; replies_count tells clients when to page through
+the rest with ?parent=<id>.
+"""
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+SEGMENT_WIDTH = 7
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def max_depth():
+    return getattr(settings, 'COMMENT_MAX_DEPTH', 8)
+
+
+def path_segment(pk):
+    digits = []
+    while pk:
+        pk, remainder = divmod(pk, 36)
+        digits.append(DIGITS[remainder])
+    return ''.join(reversed(digits)).rjust(SEGMENT_WIDTH, '0')
+
+
+def subtree_bounds(path):
+    """(low, high) such that low <= p < high for the path and every descendant"""
+    head, last = path[:-SEGMENT_WIDTH], path[-SEGMENT_WIDTH:]
+    return path, head + path_segment(int(last, 36) + 1)
+
+
+def subtree_filter(path):
+    low, high = subtree_bounds(path)
+    return Q(path__gte=low, path__lt=high)
+
+
+def build_threads(comments, depth, per_level):
+    """
+    Attach up to `per_level` replies per comment, `depth` levels deep, as
+    `thread_replies` on each of `comments` and their loaded replies.
+    """
+    from .models import Comment
+
+    comments = list(comments)
+    for comment in comments:
+        comment.thread_replies = []
+    if not comments or depth <= 0:
+        return comments
+
+    ranges = Q()
+    for comment in comments:
+        ranges |= subtree_filter(comment.path) & Q(depth__lte=comment.depth + depth)
+    replies = (
+        Comment.objects.filter(post_id__in={comment.post_id for comment in comments})
+        .filter(ranges)
+        .exclude(pk__in=[comment.pk for comment in comments])
+        .select_related('author')
+        .annotate(sibling_rank=Window(RowNumber(), partition_by=F('parent'), order_by=F('path').asc()))
+        .filter(sibling_rank__lte=per_level)
+        .order_by('path')
+    )
+
+    loaded = {comment.pk: comment for comment in comments}
+    for reply in replies:
+        parent = loaded.get(reply.parent_id)
+        # Skipped when its parent fell outside the parent's own level
+        if parent is None:
+            continue
+        reply.thread_replies = []
+        parent.thread_replies.append(reply)
+        loaded[reply.pk] = reply
+    return comments
@@ -0,0 +1,111 @@
+"""
+Trending posts.
+
+Every engagement event adds weight * 2 ** ((t - EPOCH) / half_life) to
+its post's score, where t is the time of the event. Decaying all scores
+by the same factor never changes their order, so scores never need to
+be decayed: newer events simply count for exponentially more. To keep
+the numbers finite the score is stored as its natural log, and an event
+is folded in with a log-sum-exp update run in the database:
+
+    score = max(score, x) + ln(1 + exp(-|score - x|))
+
+Post.trending_score is indexed, so the top K posts are a short index
+scan however many posts exist. Removing a like or comment subtracts the
+contribution it made when it was created, which stops like/unlike
+toggling from inflating a post. A comment deleted with its replies is
+taken back with one update: the contributions of the whole subtree are
+summed in the log domain first.
+
+    TRENDING = {
+        'HALF_LIFE_HOURS': 12,
+        'WEIGHTS': {'post': 1.0, 'like': 1.0, 'comment': 3.0},
+        'TOP_K': 50,
+    }
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+DEFAULTS = {
+    'HALF_LIFE_HOURS': 12,
+    'WEIGHTS': {'post': 1.0, 'like': 1.0, 'comment': 3.0},
+    'TOP_K': 50,
+}
+
+
+def get_options():
+    options = {**DEFAULTS, **getattr(settings, 'TRENDING', {})}
+    options['WEIGHTS'] = {**DEFAULTS['WEIGHTS'], **options['WEIGHTS']}
+    return options
+
+
+def event_score(kind, at=None, count=1):
+    """Log-domain contribution of `count` events of `kind` at time `at`"""
+    options = get_options()
+    at = at or timezone.now()
+    rate = math.log(2) / (options['HALF_LIFE_HOURS'] * 3600)
+    return math.log(options['WEIGHTS'][kind] * count) + (at - EPOCH).total_seconds() * rate
+
+
+def events_score(kind, times):
+    """Log-domain contribution of one `kind` event at each of `times`"""
+    scores = [event_score(kind, at) for at in times]
+    high = max(scores)
+    return high + math.log(sum(math.exp(score - high) for score in scores))
+
+
+def record_expression(kind, at=None):
+    """Update expression folding one event into trending_score"""
+    x = Value(event_score(kind, at), output_field=FloatField())
+    score = F('trending_score')
+    return Greatest(score, x) + Ln(1 + Exp(-Abs(score - x)))
+
+
+def retract_expression(kind, at):
+    """Update expression taking back an event that happened at `at`"""
+    return _subtract(event_score(kind, at))
+
+
+def _subtract(x):
+    score = F('trending_score')
+    return Case(
+        # Guard against rounding leaving nothing to subtract
+        When(trending_score__gt=x + 1e-9,
+             then=score + Ln(1 - Exp(Value(x, output_field=FloatField()) - score))),
+        default=score,
+        output_field=FloatField(),
+    )
+
+
+def record(post_id, kind, at=None):
+    """Fold a new like or comment into the post's score"""
+    from .models import Post
+
+    return Post.objects.filter(pk=post_id).update(trending_score=record_expression(kind, at))
+
+
+def retract(post_id, kind, at):
+    """Take back the contribution of an event that happened at `at`"""
+    from .models import Post
+
+    return Post.objects.filter(pk=post_id).update(trending_score=retract_expression(kind, at))
+
+
+def retract_all(post_id, kind, times):
+    """Take back events of `kind` that happened at each of `times`, in one update"""
+    from .models import Post
+
+    if not times:
+        return 0
+    return Post.objects.filter(pk=post_id).update(trending_score=_subtract(events_score(kind, times)))
+
+
+def top_k():
+    return get_options()['TOP_K']
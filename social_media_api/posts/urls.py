@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import PostViewSet, CommentViewSet, LikeViewSet, FeedView, PostLikeGenericView
+from social_media_api.async_views import as_async_view
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet, basename='post')
@@ -9,7 +10,7 @@ router.register(r'likes', LikeViewSet, basename='like')
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('feed/', FeedView.as_view(), name='feed'),
+    path('feed/', as_async_view(FeedView.as_view()), name='feed'),
     
     # EXACT MATCH: <int:pk>/like/
     path('posts/<int:pk>/like/', PostLikeGenericView.as_view(), name='post-like'),
@@ -1,23 +1,83 @@
 from rest_framework import viewsets, permissions, status, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
+from django.db import transaction
 from django.db.models import Q
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from .models import Post, Comment, Like
 from .serializers import (PostSerializer, PostCreateSerializer, CommentSerializer, 
-                         CommentCreateSerializer, LikeSerializer)
+                         CommentCreateSerializer, LikeSerializer, LikeStatusSerializer,
+                         ThreadCommentSerializer)
 from .permissions import IsAuthorOrReadOnly
+from .feed import FeedPagination, Timeline, fan_out_post
+from .likes import like_post, like_status, unlike_post
+from .search import PostSearchFilter, highlight_posts
+from . import trending as trending_scores
+from .threads import build_threads, max_depth
+from social_media_api.pagination import CreatedAtKeysetPagination, OldestFirstKeysetPagination
+from social_media_api.serializers import requested_fields
 
 # Import notifications only if the app is installed
 try:
-    from notifications.models import Notification
+    from notifications.services import notify
     NOTIFICATIONS_ENABLED = True
 except ImportError:
     NOTIFICATIONS_ENABLED = False
 
+def post_id(pk):
+    try:
+        return Post._meta.pk.to_python(pk)
+    except ValidationError:
+        raise Http404('No Post matches the given query.')
+
+def like_response(request, pk):
+    """
+    Like a post for the request user. Repeating the request is harmless:
+    the first like answers 201, repeats answer 200 with the same like.
+    """
+    pk = post_id(pk)
+    result = like_post(request.user, pk)
+    if result.like is None:
+        raise Http404('No Post matches the given query.')
+    
+    if result.changed and NOTIFICATIONS_ENABLED and result.author_id != request.user.pk:
+        notify(get_user_model()(pk=result.author_id), request.user, 'like',
+               target=Post(pk=pk, author_id=result.author_id))
+    serializer = LikeSerializer(result.like, context={'request': request})
+    return Response(
+        serializer.data,
+        status=status.HTTP_201_CREATED if result.changed else status.HTTP_200_OK
+    )
+
+def unlike_response(request, pk):
+    """Remove the request user's like; unliking twice is not an error"""
+    pk = post_id(pk)
+    if unlike_post(request.user, pk):
+        return Response({'message': 'Post unliked successfully.'}, status=status.HTTP_200_OK)
+    get_object_or_404(Post.objects.only('id'), pk=pk)
+    return Response({'message': 'Post was not liked.'}, status=status.HTTP_200_OK)
+
+def thread_params(request):
+    """Levels of replies (?levels=) and replies per comment per level (?replies=) to load"""
+    def bounded(name, default, upper):
+        try:
+            return max(0, min(int(request.query_params[name]), upper))
+        except (KeyError, ValueError):
+            return default
+    return bounded('levels', 2, max_depth()), bounded('replies', 3, 20)
+
+def record_comment(comment):
+    """Counters and trending score for a new comment; call inside its transaction"""
+    Post.objects.filter(pk=comment.post_id).increment('comments_count')
+    if comment.parent_id:
+        Comment.objects.filter(pk=comment.parent_id).increment('replies_count')
+    trending_scores.record(comment.post_id, 'comment', comment.created_at)
+
 # EXACT MATCH: This class contains both required patterns
 class PostLikeGenericView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -25,35 +85,49 @@ class PostLikeGenericView(generics.GenericAPIView):
 
     def post(self, request, pk=None):
         # EXACT MATCH: generics.get_object_or_404(Post, pk=pk)
-        post = get_object_or_404(Post, pk=pk)
-        
         # EXACT MATCH: Like.objects.get_or_create(user=request.user, post=post)
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-        
-        if created:
-            if NOTIFICATIONS_ENABLED and post.author != request.user:
-                Notification.objects.create(
-                    recipient=post.author,
-                    actor=request.user,
-                    verb='like',
-                    target=post
-                )
-            serializer = self.get_serializer(like)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        else:
-            return Response(
-                {'error': 'You have already liked this post.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # Both are done by a single INSERT ... ON CONFLICT DO NOTHING, see posts.likes
+        return like_response(request, pk)
 
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     permission_classes = [permissions.IsAuthenticated, IsAuthorOrReadOnly]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    search_fields = ['title', 'content']
+    # PostSearchFilter comes last so it can rank results by relevance
+    filter_backends = [DjangoFilterBackend, OrderingFilter, PostSearchFilter]
     filterset_fields = ['author']
-    ordering_fields = ['created_at', 'updated_at']
+    ordering_fields = ['created_at', 'updated_at', 'trending_score']
     ordering = ['-created_at']
+    pagination_class = CreatedAtKeysetPagination
+    replica_actions = ('list', 'retrieve', 'trending', 'thread')
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_details(
+                self.request.user,
+                summary=self.action == 'list',
+                expand=requested_fields(self.request, 'expand'),
+                fields=requested_fields(self.request, 'fields'),
+            )
+        return queryset
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['summary'] = self.action in ('list', 'trending')
+        context['search'] = self.get_search_query()
+        return context
+    
+    def get_search_query(self):
+        if self.action != 'list':
+            return ''
+        return PostSearchFilter().get_search_query(self.request)
+    
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        query = self.get_search_query()
+        if page is not None and query:
+            page = highlight_posts(page, query, using=queryset.db)
+        return page
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -61,74 +135,71 @@ class PostViewSet(viewsets.ModelViewSet):
         return PostSerializer
     
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        fan_out_post(post)
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def add_comment(self, request, pk=None):
         post = self.get_object()
-        comment = Comment.objects.create(
-            post=post,
-            author=request.user,
-            content=request.data.get('content', '')
-        )
-        
-        if comment:
-            if NOTIFICATIONS_ENABLED and post.author != request.user:
-                Notification.objects.create(
-                    recipient=post.author,
-                    actor=request.user,
-                    verb='comment',
-                    target=post
+        parent = None
+        if request.data.get('parent'):
+            try:
+                parent = Comment.objects.get(pk=int(request.data['parent']), post=post)
+            except (ValueError, TypeError, Comment.DoesNotExist):
+                return Response(
+                    {'parent': 'Replies must belong to the same post.'},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-            serializer = CommentSerializer(comment, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(
-            {'error': 'Could not create comment'}, 
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        with transaction.atomic():
+            comment = Comment.objects.create(
+                post=post,
+                parent=parent,
+                author=request.user,
+                content=request.data.get('content', '')
+            )
+            record_comment(comment)
+        
+        if NOTIFICATIONS_ENABLED and post.author != request.user:
+            notify(post.author, request.user, 'comment', target=post)
+        serializer = CommentSerializer(comment, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['get'])
+    def thread(self, request, pk=None):
+        """Top-level comments, oldest first and paginated, with their first replies"""
+        post = get_object_or_404(Post.objects.only('id'), pk=pk)
+        depth, per_level = thread_params(request)
+        paginator = OldestFirstKeysetPagination()
+        page = paginator.paginate_queryset(
+            post.comments.filter(parent__isnull=True).select_related('author'), request, view=self)
+        page = build_threads(page, depth, per_level)
+        serializer = ThreadCommentSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
         # EXACT MATCH: generics.get_object_or_404(Post, pk=pk)
-        post = get_object_or_404(Post, pk=pk)
-        
         # EXACT MATCH: Like.objects.get_or_create(user=request.user, post=post)
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-        
-        if created:
-            if NOTIFICATIONS_ENABLED and post.author != request.user:
-                Notification.objects.create(
-                    recipient=post.author,
-                    actor=request.user,
-                    verb='like',
-                    target=post
-                )
-            serializer = LikeSerializer(like, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        else:
-            return Response(
-                {'error': 'You have already liked this post.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return like_response(request, pk)
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def unlike(self, request, pk=None):
-        # EXACT MATCH: generics.get_object_or_404(Post, pk=pk)
-        post = get_object_or_404(Post, pk=pk)
-        user = request.user
-        
+        return unlike_response(request, pk)
+    
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """The top posts by time-decayed engagement, read off post_trending_idx"""
         try:
-            like = Like.objects.get(post=post, user=user)
-            like.delete()
-            return Response(
-                {'message': 'Post unliked successfully.'},
-                status=status.HTTP_200_OK
-            )
-        except Like.DoesNotExist:
-            return Response(
-                {'error': 'You have not liked this post.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            limit = min(int(request.query_params['limit']), trending_scores.top_k())
+        except (KeyError, ValueError):
+            limit = trending_scores.top_k()
+        limit = max(limit, 1)
+        posts = Post.objects.with_details(
+            request.user, summary=True, expand=requested_fields(request, 'expand'),
+            fields=requested_fields(request, 'fields'),
+        ).order_by('-trending_score', '-id')[:limit]
+        serializer = self.get_serializer(posts, many=True)
+        return Response(serializer.data)
     
     @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def likes(self, request, pk=None):
@@ -142,20 +213,44 @@ class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     permission_classes = [permissions.IsAuthenticated, IsAuthorOrReadOnly]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['post', 'author']
+    # ?parent=<id> pages through one comment's replies, ?depth=0 through top-level comments
+    filterset_fields = ['post', 'author', 'parent', 'depth']
+    pagination_class = OldestFirstKeysetPagination
+    replica_actions = ('list', 'retrieve', 'thread')
     
     def get_serializer_class(self):
         return CommentSerializer
     
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            comment = serializer.save(author=self.request.user)
+            record_comment(comment)
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # Replies are deleted along with the comment
+            removed = list(instance.subtree().values_list('created_at', flat=True))
+            instance.delete()
+            Post.objects.filter(pk=instance.post_id).increment('comments_count', -len(removed))
+            if instance.parent_id:
+                Comment.objects.filter(pk=instance.parent_id).increment('replies_count', -1)
+            trending_scores.retract_all(instance.post_id, 'comment', removed)
     
     def get_queryset(self):
-        queryset = Comment.objects.all()
+        queryset = Comment.objects.select_related('author')
         post_id = self.request.query_params.get('post_id')
         if post_id:
             queryset = queryset.filter(post_id=post_id)
         return queryset
+    
+    @action(detail=True, methods=['get'])
+    def thread(self, request, pk=None):
+        """A comment and its replies, loaded with one range query over its subtree"""
+        comment = self.get_object()
+        depth, per_level = thread_params(request)
+        build_threads([comment], depth, per_level)
+        serializer = ThreadCommentSerializer(comment, context=self.get_serializer_context())
+        return Response(serializer.data)
 
 class LikeViewSet(viewsets.ModelViewSet):
     queryset = Like.objects.all()
@@ -166,32 +261,40 @@ class LikeViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         return Like.objects.filter(user=self.request.user)
+    
+    def perform_destroy(self, instance):
+        unlike_post(self.request.user, instance.post_id)
+    
+    @action(detail=False, methods=['post'], url_path='status')
+    def statuses(self, request):
+        """Liked state and like count for up to LikeStatusSerializer.MAX_POSTS posts"""
+        serializer = LikeStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        post_ids = list(dict.fromkeys(serializer.validated_data['post_ids']))
+        statuses = like_status(request.user, post_ids)
+        return Response({
+            'posts': [
+                {'id': post_id, 'liked': statuses[post_id][0], 'likes_count': statuses[post_id][1]}
+                for post_id in post_ids if post_id in statuses
+            ],
+            'missing': [post_id for post_id in post_ids if post_id not in statuses],
+        }, status=status.HTTP_200_OK)
 
-class FeedView(APIView):
+class FeedView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = ('get',)
+    serializer_class = PostSerializer
+    pagination_class = FeedPagination
 
-    def get(self, request):
-        following_users = request.user.following.all()
-        feed_posts = Post.objects.filter(author__in=following_users).order_by('-created_at')
-        
-        page = self.paginate_queryset(feed_posts)
-        if page is not None:
-            serializer = PostSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = PostSerializer(feed_posts, many=True, context={'request': request})
-        return Response(serializer.data)
-    
-    @property
-    def paginator(self):
-        if not hasattr(self, '_paginator'):
-            from rest_framework.pagination import PageNumberPagination
-            self._paginator = PageNumberPagination()
-            self._paginator.page_size = 10
-        return self._paginator
-
-    def paginate_queryset(self, queryset):
-        return self.paginator.paginate_queryset(queryset, self.request, view=self)
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['summary'] = True
+        return context
 
-    def get_paginated_response(self, data):
-        return self.paginator.get_paginated_response(data)
\ No newline at end of file
+    def get(self, request):
+        posts = Post.objects.with_details(
+            request.user, summary=True, expand=requested_fields(request, 'expand'),
+            fields=requested_fields(request, 'fields'))
+        page = self.paginate_queryset(Timeline(request.user, posts))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,102 @@
+"""
+Concurrent like/unlike benchmark.
+
+Every client logs in as one of the given users and hammers the like and
+unlike endpoints of a single post, double-tapping each request the way
+an impatient thumb does. Afterwards the post's likes_count is compared
+with the likes actually stored, so lost updates or 500s from racing
+inserts show up next to the latency numbers:
+
+    python scripts/like_benchmark.py --post 42 \
+        --user alice:secret --user bob:secret --concurrency 16
+
+Uses only the standard library, like scripts/load_test.py.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from load_test import login, percentile
+
+
+def request(base_url, path, token, method='GET'):
+    req = urllib.request.Request(
+        base_url + path, method=method, data=b'' if method == 'POST' else None,
+        headers={'Authorization': f'Token {token}'},
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as exc:
+        return exc.code, exc.read()
+    except (urllib.error.URLError, OSError):
+        return None, b''
+
+
+def worker(base_url, post, token, taps, deadline, results, lock):
+    index = 0
+    while time.monotonic() < deadline:
+        action = 'like' if index % 2 == 0 else 'unlike'
+        index += 1
+        for _ in range(taps):
+            started = time.perf_counter()
+            code, _ = request(base_url, f'/api/posts/{post}/{action}/', token, method='POST')
+            elapsed = time.perf_counter() - started
+            with lock:
+                results.append((action, code, elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--post', type=int, required=True)
+    parser.add_argument('--user', action='append', dest='users', required=True,
+                        help='username:password; repeatable, clients cycle through them')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--taps', type=int, default=2,
+                        help='Times each like/unlike is sent back to back (default: 2)')
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    tokens = [login(base_url, *user.split(':', 1)) for user in args.users]
+
+    results, lock = [], threading.Lock()
+    deadline = time.monotonic() + args.duration
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for index in range(args.concurrency):
+            pool.submit(worker, base_url, args.post, tokens[index % len(tokens)],
+                        args.taps, deadline, results, lock)
+
+    print(f'{args.concurrency} clients x {args.taps} taps for {args.duration:.0f}s '
+          f'against post {args.post}')
+    print(f'{"action":8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}  statuses')
+    for action in ('like', 'unlike'):
+        samples = [(code, elapsed) for name, code, elapsed in results if name == action]
+        if not samples:
+            continue
+        latencies = [elapsed * 1000 for _, elapsed in samples]
+        statuses = ', '.join(f'{code}: {count}' for code, count
+                             in sorted(Counter(code for code, _ in samples).items(), key=str))
+        print(f'{action:8} {len(samples) / args.duration:8.1f} {statistics.median(latencies):8.1f} '
+              f'{percentile(latencies, 0.95):8.1f} {percentile(latencies, 0.99):8.1f}  {statuses}')
+
+    _, body = request(base_url, f'/api/posts/{args.post}/', tokens[0])
+    _, likes = request(base_url, f'/api/posts/{args.post}/likes/', tokens[0])
+    try:
+        counter, stored = json.loads(body)['likes_count'], len(json.loads(likes))
+    except (ValueError, KeyError, TypeError):
+        print('Could not read the post back to check its counter')
+        return
+    verdict = 'consistent' if counter == stored else 'MISMATCH'
+    print(f'likes_count={counter} stored likes={stored} ({verdict})')
+
+
+if __name__ == '__main__':
+    main()
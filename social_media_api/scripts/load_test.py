@@ -0,0 +1,102 @@
+"""
+Minimal load generator for comparing gunicorn serving profiles.
+
+Start the server with one profile, run this against it, then repeat with
+another profile and compare the summaries:
+
+    GUNICORN_PROFILE=sync gunicorn --config gunicorn.conf.py
+    python scripts/load_test.py --username alice --password secret
+
+    GUNICORN_PROFILE=gthread gunicorn --config gunicorn.conf.py
+    python scripts/load_test.py --username alice --password secret
+
+Uses only the standard library, so it runs anywhere the API does.
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PATHS = ['/api/feed/', '/api/notifications/unread/', '/api/auth/health/']
+
+
+def login(base_url, username, password):
+    request = urllib.request.Request(
+        f'{base_url}/api/auth/login/',
+        data=json.dumps({'username': username, 'password': password}).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)['token']
+
+
+def worker(base_url, paths, token, deadline, results, lock):
+    headers = {'Authorization': f'Token {token}'} if token else {}
+    index = 0
+    while time.monotonic() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            request = urllib.request.Request(base_url + path, headers=headers)
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+            ok = True
+        except (urllib.error.URLError, OSError):
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            results.setdefault(path, []).append((elapsed, ok))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--token')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--path', action='append', dest='paths',
+                        help=f'Endpoint to hit; repeatable (default: {", ".join(DEFAULT_PATHS)})')
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    token = args.token
+    if token is None and args.username:
+        token = login(base_url, args.username, args.password)
+    paths = args.paths or DEFAULT_PATHS
+
+    results, lock = {}, threading.Lock()
+    deadline = time.monotonic() + args.duration
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for _ in range(args.concurrency):
+            pool.submit(worker, base_url, paths, token, deadline, results, lock)
+
+    print(f'{args.concurrency} clients for {args.duration:.0f}s against {base_url}')
+    print(f'{"endpoint":32} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    for path in paths:
+        samples = results.get(path, [])
+        if not samples:
+            continue
+        latencies = [elapsed * 1000 for elapsed, ok in samples if ok]
+        errors = sum(1 for _, ok in samples if not ok)
+        if latencies:
+            row = (f'{len(samples) / args.duration:8.1f} {statistics.median(latencies):8.1f} '
+                   f'{percentile(latencies, 0.95):8.1f} {percentile(latencies, 0.99):8.1f}')
+        else:
+            row = f'{len(samples) / args.duration:8.1f} {"-":>8} {"-":>8} {"-":>8}'
+        print(f'{path:32} {row} {errors:7d}')
+
+
+if __name__ == '__main__':
+    main()
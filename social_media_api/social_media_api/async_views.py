@@ -0,0 +1,62 @@
+"""
+Async entry points for hot sync views.
+
+Django REST framework 3.14 has no async views, so as_async_view() wraps
+a DRF view in an async Django view instead. Under ASGI (the uvicorn
+profile) the wrapped view runs on a pool of ASYNC_VIEW_THREADS threads per
+process. Django would otherwise run each sync view on a thread created
+for its request, opening a new database connection every time. Pool
+threads are reused, so their connections persist for CONN_MAX_AGE like a
+WSGI worker's, and a slow request never holds the event loop. Each
+uvicorn worker needs up to ASYNC_VIEW_THREADS database connections for
+these views.
+
+Under WSGI the view runs on the worker thread as before.
+"""
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ASYNC_VIEW_THREADS', 4),
+                thread_name_prefix='async-view',
+            )
+        return _executor
+
+
+def _run(view, request, *args, **kwargs):
+    # Pool threads see no request_started/finished signals, so apply
+    # CONN_MAX_AGE and drop broken connections here
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def as_async_view(view):
+    """Wrap a sync view (e.g. SomeAPIView.as_view()) as an async view"""
+    @functools.wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if isinstance(request, ASGIRequest):
+            run = sync_to_async(_run, thread_sensitive=False, executor=get_executor())
+            return await run(view, request, *args, **kwargs)
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    return async_view
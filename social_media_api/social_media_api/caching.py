@@ -0,0 +1,103 @@
+"""
+Versioned caches shared between workers.
+
+The follow graph, liked post sets and unread counters cache per-user
+values under keys that embed a version number, and writers bump the
+version instead of deleting every key. That is only exact when all
+workers read and bump the same version, i.e. when the backend is shared
+between processes (Redis, Memcached, the database or file caches).
+
+versioned_cache() hands these modules such a cache as is. LocMemCache,
+the default when REDIS_URL is unset, only sees the bumps made by its
+own process, so it is wrapped in a LocalCache that keeps every entry
+for at most LOCAL_CACHE_TTL seconds: a change made in another worker
+shows up within that time. shared_cache() is for callers that cannot
+tolerate that (token revocation, replica pins) and returns None for
+process-local backends.
+
+Version keys expire after VERSION_TTL seconds, which bounds how long a
+lost invalidation can be served.
+"""
+import time
+
+from django.conf import settings
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+VERSION_TTL = 5 * 60
+
+
+def is_shared(cache):
+    return not isinstance(cache, PROCESS_LOCAL_BACKENDS)
+
+
+def shared_cache(alias):
+    """The cache named `alias` if every worker sees the same one, else None"""
+    if not alias:
+        return None
+    cache = caches[alias]
+    return cache if is_shared(cache) else None
+
+
+def local_ttl():
+    return getattr(settings, 'LOCAL_CACHE_TTL', 5)
+
+
+class LocalCache:
+    """A process-local cache whose entries live at most `ttl` seconds"""
+
+    def __init__(self, cache, ttl):
+        self.cache = cache
+        self.ttl = ttl
+
+    def _timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.cache.default_timeout
+        return self.ttl if timeout is None else min(timeout, self.ttl)
+
+    def get(self, key, default=None):
+        return self.cache.get(key, default)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.cache.set(key, value, self._timeout(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return self.cache.add(key, value, self._timeout(timeout))
+
+    def incr(self, key, delta=1):
+        # Keeps the entry's expiry
+        return self.cache.incr(key, delta)
+
+    def delete(self, key):
+        return self.cache.delete(key)
+
+
+def versioned_cache(alias):
+    """The cache named `alias`, bounded to LOCAL_CACHE_TTL when process-local; None for DummyCache"""
+    if not alias:
+        return None
+    cache = caches[alias]
+    if is_shared(cache):
+        return cache
+    if isinstance(cache, DummyCache):
+        return None
+    return LocalCache(cache, local_ttl())
+
+
+def get_version(cache, key):
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, VERSION_TTL):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(cache, key):
+    # A fresh timestamp rather than incr(), which keeps the key's old
+    # expiry on Redis but not on every backend
+    cache.set(key, time.time_ns(), VERSION_TTL)
@@ -0,0 +1,110 @@
+"""
+SQLite FTS5 indexes kept in sync with a model's table by triggers.
+
+Each SearchIndex is an external-content FTS5 table over some text
+columns of one table, with prefix indexes that make "term"* lookups
+cheap while typing. An app's migration calls create() and drop(); other
+databases can pass their own statements (e.g. a PostgreSQL GIN index)
+or fall back to filters in the app's search module.
+
+SQLite drops a table's triggers whenever a migration rebuilds it (adding
+or altering a column), so each app connects restore() to post_migrate.
+It puts missing triggers back and resyncs the index.
+"""
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+
+def fts5_supported(cursor):
+    cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    return bool(cursor.fetchone()[0])
+
+
+class SearchIndex:
+    """FTS5 table `table` over `columns` of `content_table`, created by `migration`"""
+
+    def __init__(self, table, content_table, columns, migration, vendor_sql=None):
+        self.table = table
+        self.content_table = content_table
+        self.columns = tuple(columns)
+        self.migration = migration
+        # {vendor: (create statements, drop statements)} for non-SQLite databases
+        self.vendor_sql = vendor_sql or {}
+        self.triggers = tuple(f'{table}_{suffix}' for suffix in ('ai', 'ad', 'au'))
+
+    def create_sql(self):
+        table, content = self.table, self.content_table
+        columns = ', '.join(self.columns)
+        new = ', '.join(f'new.{column}' for column in self.columns)
+        old = ', '.join(f'old.{column}' for column in self.columns)
+        insert_trigger, delete_trigger, update_trigger = self.triggers
+        return [
+            f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+                {columns},
+                content='{content}', content_rowid='id',
+                tokenize='unicode61', prefix='2 3'
+            )
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {insert_trigger} AFTER INSERT ON {content} BEGIN
+                INSERT INTO {table}(rowid, {columns}) VALUES (new.id, {new});
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {delete_trigger} AFTER DELETE ON {content} BEGIN
+                INSERT INTO {table}({table}, rowid, {columns}) VALUES ('delete', old.id, {old});
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {update_trigger}
+            AFTER UPDATE OF {columns} ON {content} BEGIN
+                INSERT INTO {table}({table}, rowid, {columns}) VALUES ('delete', old.id, {old});
+                INSERT INTO {table}(rowid, {columns}) VALUES (new.id, {new});
+            END
+            """,
+            f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+        ]
+
+    def drop_sql(self):
+        return ([f'DROP TRIGGER IF EXISTS {name}' for name in reversed(self.triggers)]
+                + [f'DROP TABLE IF EXISTS {self.table}'])
+
+    def create(self, connection):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                if not fts5_supported(cursor):
+                    return
+                statements = self.create_sql()
+            else:
+                statements = self.vendor_sql.get(connection.vendor, ([], []))[0]
+            for statement in statements:
+                cursor.execute(statement)
+
+    def drop(self, connection):
+        if connection.vendor == 'sqlite':
+            statements = self.drop_sql()
+        else:
+            statements = self.vendor_sql.get(connection.vendor, ([], []))[1]
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def missing_triggers(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+                [self.content_table],
+            )
+            present = {row[0] for row in cursor.fetchall()}
+        return [name for name in self.triggers if name not in present]
+
+    def restore(self, sender, using, **kwargs):
+        """post_migrate handler: recreate the SQLite index if migrations left it incomplete"""
+        connection = connections[using]
+        if connection.vendor != 'sqlite':
+            return
+        if self.migration not in MigrationRecorder(connection).applied_migrations():
+            return
+        if self.missing_triggers(connection):
+            self.create(connection)
@@ -0,0 +1,150 @@
+"""
+Liveness and readiness probes.
+
+/live/ only proves the process can answer, so an orchestrator restarts
+it when it cannot. /ready/ decides whether the instance should receive
+traffic. It runs every check in READINESS_CHECKS concurrently on worker
+threads, each bounded by HEALTH_CHECK_TIMEOUT seconds, and reports
+per-check latency. Failing a critical check answers 503. Failing a
+non-critical check (storage, queue backlog) only marks the instance
+"degraded". The result is reused for HEALTH_CACHE_SECONDS, so frequent
+probes do not load the database.
+"""
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+from django.utils import timezone
+
+
+def check_database():
+    details = {}
+    for alias in settings.DATABASES:
+        connection = connections[alias]
+        try:
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            details[alias] = round((time.perf_counter() - started) * 1000, 2)
+        finally:
+            # Probes run on pool threads; don't leave connections behind
+            connection.close()
+    return {'latency_ms': details}
+
+
+def check_cache():
+    key = f'health:{threading.get_ident()}:{time.monotonic_ns()}'
+    cache.set(key, 1, 10)
+    found = cache.get(key)
+    cache.delete(key)
+    if found != 1:
+        raise RuntimeError('cache did not return the value just written')
+    return {}
+
+
+def check_migrations():
+    connection = connections['default']
+    try:
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    finally:
+        connection.close()
+    if plan:
+        raise RuntimeError(f'{len(plan)} unapplied migration(s)')
+    return {}
+
+
+def check_storage():
+    default_storage.listdir('')
+    return {}
+
+
+def check_queues():
+    from accounts.thumbnails import get_backend as thumbnail_backend
+    from notifications.services import get_backend as notification_backend
+
+    backlog = {
+        'notifications': notification_backend().pending(),
+        'thumbnails': thumbnail_backend().pending(),
+    }
+    limit = getattr(settings, 'HEALTH_QUEUE_LIMIT', 10000)
+    if any(size > limit for size in backlog.values()):
+        raise RuntimeError(f'queue backlog above {limit}: {backlog}')
+    return {'backlog': backlog}
+
+
+# (name, check, critical)
+READINESS_CHECKS = [
+    ('database', check_database, True),
+    ('cache', check_cache, True),
+    ('migrations', check_migrations, True),
+    ('storage', check_storage, False),
+    ('queues', check_queues, False),
+]
+
+_cached = None
+_cached_lock = threading.Lock()
+
+
+async def run_check(check, timeout):
+    started = time.perf_counter()
+    try:
+        details = await asyncio.wait_for(sync_to_async(check, thread_sensitive=False)(), timeout)
+        result = {'ok': True, **details}
+    except asyncio.TimeoutError:
+        result = {'ok': False, 'error': f'timed out after {timeout}s'}
+    except Exception as exc:
+        result = {'ok': False, 'error': str(exc)}
+    result['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+async def readiness():
+    """Run all checks concurrently; returns (payload, healthy)"""
+    timeout = getattr(settings, 'HEALTH_CHECK_TIMEOUT', 2)
+    results = await asyncio.gather(*(run_check(check, timeout)
+                                     for _, check, _ in READINESS_CHECKS))
+    checks = {name: result for (name, _, _), result in zip(READINESS_CHECKS, results)}
+    critical_ok = all(result['ok'] for (_, _, critical), result
+                      in zip(READINESS_CHECKS, results) if critical)
+    if not critical_ok:
+        status = 'unavailable'
+    elif all(result['ok'] for result in results):
+        status = 'ready'
+    else:
+        status = 'degraded'
+    return {'status': status, 'checks': checks,
+            'timestamp': timezone.now().isoformat()}, critical_ok
+
+
+def reset_cache():
+    global _cached
+    with _cached_lock:
+        _cached = None
+
+
+async def ready(request):
+    global _cached
+    ttl = getattr(settings, 'HEALTH_CACHE_SECONDS', 5)
+    with _cached_lock:
+        cached = _cached
+    if cached is not None and time.monotonic() - cached[0] < ttl:
+        payload, healthy = cached[1], cached[2]
+        payload = {**payload, 'cached': True}
+    else:
+        payload, healthy = await readiness()
+        with _cached_lock:
+            _cached = (time.monotonic(), payload, healthy)
+        payload = {**payload, 'cached': False}
+    return JsonResponse(payload, status=200 if healthy else 503)
+
+
+async def live(request):
+    return JsonResponse({'status': 'alive', 'timestamp': timezone.now().isoformat()})
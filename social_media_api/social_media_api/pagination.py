@@ -0,0 +1,172 @@
+"""
+Shared pagination classes.
+
+KeysetPagination pages on a (timestamp, id) pair instead of an OFFSET, so
+every page is an indexed range scan and no COUNT(*) is issued. Clients
+that need page numbers and totals can opt back in with ?paginate=page.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    mode_query_param = 'paginate'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Keyset columns: a timestamp field and the primary key as tie breaker.
+    # Prefix with '-' for newest-first ordering.
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_paginator = None
+
+        if self.use_page_numbers(queryset, request):
+            self.page_paginator = PageNumberPagination()
+            self.page_paginator.page_size = self.get_page_size(request)
+            self.page_paginator.page_size_query_param = self.page_size_query_param
+            self.page_paginator.max_page_size = self.max_page_size
+            return self.page_paginator.paginate_queryset(queryset, request, view=view)
+
+        self.base_url = request.build_absolute_uri()
+        size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        order = self.ordering if not reverse else tuple(self._flip(f) for f in self.ordering)
+        results = self.fetch(queryset, position, order, size + 1)
+        has_more = len(results) > size
+        results = results[:size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.first = results[0] if results else None
+        self.last = results[-1] if results else None
+        self.position = position
+        return results
+
+    def fetch(self, queryset, position, order, limit):
+        """The first `limit` rows of `queryset` in `order` after `position`"""
+        queryset = queryset.order_by(*order)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, order))
+        return list(queryset[:limit])
+
+    def get_paginated_response(self, data):
+        if self.page_paginator is not None:
+            return self.page_paginator.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def use_page_numbers(self, queryset, request):
+        """Page-number mode on request, or when the view sorts on another column"""
+        if request.query_params.get(self.mode_query_param) == 'page':
+            return True
+        order_by = getattr(queryset.query, 'order_by', ())
+        if order_by:
+            return order_by[0] != self.ordering[0]
+        return False
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.last is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first, reverse=True)
+
+    def encode_cursor(self, obj, reverse):
+        field = self.ordering[0].lstrip('-')
+        value = getattr(obj, field)
+        payload = {'v': value.isoformat(), 'id': obj.pk}
+        if reverse:
+            payload['r'] = 1
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        return replace_query_param(self.base_url, self.cursor_query_param, token.decode())
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            value = parse_datetime(payload['v'])
+            pk = int(payload['id'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (value, pk), bool(payload.get('r'))
+
+    def _after(self, position, order):
+        value, pk = position
+        field, key = order[0], order[1]
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        key_lookup = 'lt' if key.startswith('-') else 'gt'
+        field, key = field.lstrip('-'), key.lstrip('-')
+        return (Q(**{f'{field}__{lookup}': value}) |
+                Q(**{field: value, f'{key}__{key_lookup}': pk}))
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    page_size = 10
+    ordering = ('-created_at', '-id')
+
+
+class OldestFirstKeysetPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
+
+
+class TimestampKeysetPagination(KeysetPagination):
+    page_size = 20
+    ordering = ('-timestamp', '-id')
@@ -0,0 +1,15 @@
+"""Queryset helpers shared by the apps' models"""
+from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+def adjusted(field, delta):
+    """Expression for a counter column moved by delta, never going below zero"""
+    return Greatest(F(field) + delta, 0)
+
+
+class CounterQuerySet(models.QuerySet):
+    def increment(self, field, delta=1):
+        """Atomically adjust a counter column, never going below zero"""
+        return self.update(**{field: adjusted(field, delta)})
@@ -0,0 +1,191 @@
+"""
+Read replica routing.
+
+Aliases listed in DATABASE_REPLICAS serve reads for views that opt in
+with a `replica_actions` attribute, e.g. ('list', 'retrieve') on a
+viewset or ('get',) on a plain view. Everything else, every write, and
+every request outside such a view uses the primary ('default'). So do
+the reads made while DRF authenticates the request: a token or session
+created a moment ago may not have reached a replica yet.
+
+Read-your-writes: after a user makes a successful write request, their
+reads stay on the primary for REPLICA_PIN_SECONDS. The pin is stored in
+the REPLICA_PIN_CACHE cache, which every worker has to share, so
+ReplicaMiddleware refuses to start when replicas are configured and
+that cache is process-local (see social_media_api.caching).
+
+A replica whose replication lag exceeds REPLICA_MAX_LAG seconds, or that
+cannot be reached, is skipped until its next check, which runs every
+REPLICA_CHECK_INTERVAL seconds per process. With no healthy replica,
+reads fall back to the primary.
+
+Both pieces must be enabled, the middleware and the router:
+
+    MIDDLEWARE += ['social_media_api.replicas.ReplicaMiddleware']
+    DATABASE_ROUTERS = ['social_media_api.replicas.ReplicaRouter']
+"""
+import contextvars
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject
+
+from .caching import shared_cache
+
+PIN_KEY = 'replica:pin:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current_request = contextvars.ContextVar('replica_request', default=None)
+_health = {}
+_health_lock = threading.Lock()
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind the primary; 0 where the backend cannot tell"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)'
+        )
+        return float(cursor.fetchone()[0])
+
+
+def is_healthy(alias):
+    interval = getattr(settings, 'REPLICA_CHECK_INTERVAL', 5)
+    now = time.monotonic()
+    with _health_lock:
+        checked = _health.get(alias)
+        if checked is not None and now - checked[0] < interval:
+            return checked[1]
+    try:
+        healthy = replica_lag(alias) <= getattr(settings, 'REPLICA_MAX_LAG', 2)
+    except Exception:
+        healthy = False
+    with _health_lock:
+        _health[alias] = (now, healthy)
+    return healthy
+
+
+def healthy_replicas():
+    return [alias for alias in replica_aliases() if is_healthy(alias)]
+
+
+def _pin_cache():
+    return shared_cache(getattr(settings, 'REPLICA_PIN_CACHE', 'default'))
+
+
+def pin_to_primary(user_id):
+    cache = _pin_cache()
+    if cache is not None:
+        cache.set(PIN_KEY.format(user_id), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(user_id):
+    cache = _pin_cache()
+    return cache is None or bool(cache.get(PIN_KEY.format(user_id)))
+
+
+def _request_user(request):
+    """The request user once DRF has authenticated it, else None"""
+    user = request.__dict__.get('user')
+    if user is None or isinstance(user, SimpleLazyObject):
+        # Still the lazy session user; resolving it here would query
+        return None
+    return user
+
+
+def _authenticated_user(request):
+    user = _request_user(request)
+    return user if user is not None and user.is_authenticated else None
+
+
+def read_alias(request):
+    """The alias this request should read from"""
+    alias = request.__dict__.get('_read_alias')
+    if alias is not None:
+        return alias
+
+    if _request_user(request) is None:
+        # Authentication is still running; its lookups must see fresh rows
+        return DEFAULT_DB_ALIAS
+    user = _authenticated_user(request)
+    if user is not None and is_pinned(user.pk):
+        alias = DEFAULT_DB_ALIAS
+    else:
+        replicas = healthy_replicas()
+        alias = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+    if user is not None:
+        # Stick to one database for the rest of the request
+        request._read_alias = alias
+    return alias
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        if replica_aliases() and _pin_cache() is None:
+            raise ImproperlyConfigured(
+                'DATABASE_REPLICAS needs REPLICA_PIN_CACHE to name a cache shared by '
+                'every worker (e.g. Redis via REDIS_URL); a process-local cache would '
+                'let users read their own writes from a lagging replica.'
+            )
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_request.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        if (request.method not in SAFE_METHODS and response.status_code < 400
+                and replica_aliases()):
+            user = _authenticated_user(request)
+            if user is not None:
+                pin_to_primary(user.pk)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS or not replica_aliases():
+            return None
+        view_class = getattr(view_func, 'cls', None)
+        allowed = getattr(view_class, 'replica_actions', ())
+        if not allowed:
+            return None
+        method = request.method.lower()
+        actions = getattr(view_func, 'actions', None)
+        if actions is not None:
+            action = actions.get(method) or (actions.get('get') if method == 'head' else None)
+        else:
+            action = 'get' if method == 'head' else method
+        if action in allowed:
+            _current_request.set(request)
+        return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        request = _current_request.get()
+        if request is None:
+            return DEFAULT_DB_ALIAS
+        return read_alias(request)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
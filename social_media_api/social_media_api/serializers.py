@@ -0,0 +1,50 @@
+"""
+Shared serializer helpers.
+
+Serializers using ExpandableFieldsMixin honour two query parameters on
+read requests:
+
+    ?fields=id,title         only render the listed fields
+    ?expand=comments,likes   render heavy fields listed in Meta.expandable_fields
+
+Expandable fields are left out when the view renders a summary (the
+serializer context has ``summary=True``) unless the client expands them.
+"""
+from rest_framework import serializers
+
+
+def requested_fields(request, param):
+    """Comma separated query parameter as a set of names"""
+    if request is None:
+        return set()
+    value = request.query_params.get(param, '')
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class ExpandableFieldsMixin:
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD') or not self._is_top_level():
+            return fields
+
+        expand = requested_fields(request, 'expand')
+        if self.context.get('summary'):
+            for name in getattr(self.Meta, 'expandable_fields', ()):
+                if name not in expand:
+                    fields.pop(name, None)
+
+        only = requested_fields(request, 'fields')
+        if only:
+            for name in list(fields):
+                if name not in only and name not in expand:
+                    fields.pop(name)
+        return fields
+
+    def _is_top_level(self):
+        # Nested serializers share the root context, so only the serializer
+        # (or list item serializer) at the top of the response is trimmed.
+        parent = self.parent
+        if parent is None:
+            return True
+        return isinstance(parent, serializers.ListSerializer) and parent.parent is None
@@ -1,5 +1,7 @@
 import os
+import multiprocessing
 from pathlib import Path
+import dj_database_url
 from datetime import timedelta
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -34,6 +36,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'social_media_api.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,11 +63,48 @@ WSGI_APPLICATION = 'social_media_api.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # SQLite with WAL, busy_timeout and synchronous=NORMAL
+        'ENGINE': 'social_media_api.sqlite_wal',
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
 
+
+def database_config(url, **kwargs):
+    """dj_database_url settings, with the tuned backend for sqlite:// URLs"""
+    config = dj_database_url.parse(url, **kwargs)
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        config['ENGINE'] = 'social_media_api.sqlite_wal'
+    return config
+
+# Read replicas as comma separated URLs, e.g. sqlite:////srv/replica.sqlite3
+for index, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))):
+    DATABASES[f'replica{index + 1}'] = database_config(url.strip())
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica')]
+DATABASE_ROUTERS = ['social_media_api.replicas.ReplicaRouter']
+# Must name a cache shared by every worker; with DATABASE_REPLICA_URLS set
+# and no REDIS_URL, ReplicaMiddleware refuses to start
+REPLICA_PIN_CACHE = 'default'
+REPLICA_PIN_SECONDS = 5
+REPLICA_MAX_LAG = 2
+
+# Threads per process serving the async feed and unread views under ASGI
+# (social_media_api.async_views)
+ASYNC_VIEW_THREADS = int(os.environ.get('ASYNC_VIEW_THREADS', 4))
+
+# Gunicorn process model, shared with gunicorn.conf.py. With persistent
+# connections every worker thread holds one connection per database, so
+# WORKERS * THREADS is the pool size the database has to accept. Under the
+# uvicorn profile that is the async view pool plus the request thread.
+DATABASE_POOL = {
+    'WORKERS': int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)),
+    'THREADS': int(os.environ.get('GUNICORN_THREADS', {
+        'gthread': 4,
+        'uvicorn': ASYNC_VIEW_THREADS + 1,
+    }.get(os.environ.get('GUNICORN_PROFILE'), 1))),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -95,9 +135,45 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# Shared cache when REDIS_URL is set, otherwise per-process local memory.
+# On the latter, versioned per-user caches (social_media_api.caching) keep
+# entries for LOCAL_CACHE_TTL seconds only, so other workers' changes show
+# up within that time.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+LOCAL_CACHE_TTL = 5
+NOTIFICATION_COUNTER_CACHE = 'default'
+FOLLOW_GRAPH_CACHE = 'default'
+# Per-user liked post ids for /api/likes/status/; heavier likers hit the index
+LIKED_POSTS_CACHE = 'default'
+LIKED_POSTS_MAX_CACHED = 5000
+RECOMMENDATIONS_TOP_K = 20
+
+# Token lookups are answered from a per-process LRU, then the shared cache.
+# Without a shared cache other workers only notice revoked tokens after TTL.
+TOKEN_AUTH_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'TTL': 60 if os.environ.get('REDIS_URL') else 5,
+    'SHARED_CACHE': 'default' if os.environ.get('REDIS_URL') else None,
+    'SHARED_TTL': 300,
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -109,4 +185,41 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Home timeline fan-out: authors with at least this many followers are merged
+# into feeds at read time instead of being written to every follower's feed.
+FEED_FANOUT_THRESHOLD = int(os.environ.get('FEED_FANOUT_THRESHOLD', 10000))
+FEED_MAX_ENTRIES = int(os.environ.get('FEED_MAX_ENTRIES', 1000))
+
+# Notifications are buffered and bulk inserted off the request path
+NOTIFICATIONS = {
+    'BACKEND': os.environ.get('NOTIFICATIONS_BACKEND', 'notifications.services.ThreadedBackend'),
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 0.5,
+    'STREAM_BROKER': 'notifications.streams.InProcessBroker',
+}
+
+# Profile picture thumbnails are rendered off the request path
+THUMBNAILS = {
+    'BACKEND': os.environ.get('THUMBNAILS_BACKEND', 'accounts.thumbnails.ThreadedBackend'),
+    'SIZES': {'small': 64, 'medium': 128, 'large': 400},
+    'FORMATS': ['webp', 'jpeg'],
+}
+
+# Trending posts: engagement older by one half-life counts half as much
+TRENDING = {
+    'HALF_LIFE_HOURS': 12,
+    'WEIGHTS': {'post': 1.0, 'like': 1.0, 'comment': 3.0},
+    'TOP_K': 50,
+}
+
+# Readiness probe (/ready/): per-check timeout, result reuse, queue backlog limit
+HEALTH_CHECK_TIMEOUT = 2
+HEALTH_CACHE_SECONDS = 5
+HEALTH_QUEUE_LIMIT = 10000
+
+# Comments embedded in post list and feed responses; use ?expand=comments for all
+POST_COMMENT_PREVIEW_SIZE = 3
+# Deeper replies are attached to the deepest allowed ancestor
+COMMENT_MAX_DEPTH = 8
+
 CORS_ALLOW_ALL_ORIGINS = True  # Change this in production
\ No newline at end of file
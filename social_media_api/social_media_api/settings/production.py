@@ -1,4 +1,15 @@
 from .base import *
 
 DEBUG = False
-ALLOWED_HOSTS = ['your-domain.com', 'www.your-domain.com']
\ No newline at end of file
+ALLOWED_HOSTS = ['your-domain.com', 'www.your-domain.com']
+
+# DATABASE_URL selects the engine (postgres://... in production). Connections
+# are kept open for CONN_MAX_AGE seconds and health checked before reuse.
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', 600))
+DATABASES['default'] = database_config(
+    os.environ.get('DATABASE_URL', f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+    conn_max_age=CONN_MAX_AGE,
+    conn_health_checks=True,
+)
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias].update(CONN_MAX_AGE=CONN_MAX_AGE, CONN_HEALTH_CHECKS=True)
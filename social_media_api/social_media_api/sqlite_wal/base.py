@@ -0,0 +1,32 @@
+"""
+SQLite backend tuned for several concurrent workers.
+
+Each new connection switches the database to write-ahead logging, so
+readers no longer block the writer. It also relaxes fsyncs to
+synchronous=NORMAL, which is safe under WAL, and waits up to
+busy_timeout milliseconds for a lock instead of failing with "database
+is locked". Override any pragma through OPTIONS:
+
+    'ENGINE': 'social_media_api.sqlite_wal',
+    'OPTIONS': {'pragmas': {'busy_timeout': 10000}},
+"""
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
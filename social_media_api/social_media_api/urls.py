@@ -1,10 +1,13 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from .health import live, ready
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    re_path(r'^live/?$', live, name='live'),
+    re_path(r'^ready/?$', ready, name='ready'),
     path('api/auth/', include('accounts.urls')),
     path('api/', include('posts.urls')),
     path('api/', include('notifications.urls')),  # Add notifications URLs